@@ -0,0 +1,199 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from google.api_core.exceptions import AlreadyExists
+
+from .firestore_io import run_db
+from .metrics import LATENCY_BUCKETS, registry
+
+MAX_BATCH_OPS = 500  # Firestore limit per batched write
+FLUSH_DELAY_SECONDS = float(os.getenv("TRANSACTION_FLUSH_MS", "5")) / 1000
+MAX_COMMIT_ATTEMPTS = 3
+JOURNAL_RETRY_SECONDS = 5.0
+
+
+class WriteJournal:
+    """Local SQLite log of buffered writes that have not been committed yet
+
+    A BatchWriter with a journal records each write before acknowledging it and
+    deletes it after the commit, so writes pending at a crash are replayed on
+    the next start instead of being lost.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pending_writes "
+            "(doc_path TEXT PRIMARY KEY, data TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._lock = threading.Lock()
+
+    def append(self, doc_path: str, data: Dict[str, Any]):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pending_writes (doc_path, data, created_at) VALUES (?, ?, ?)",
+                (doc_path, json.dumps(data, separators=(",", ":")), time.time()),
+            )
+
+    def remove(self, doc_paths: List[str]):
+        with self._lock:
+            self._conn.executemany("DELETE FROM pending_writes WHERE doc_path = ?", [(p,) for p in doc_paths])
+
+    def entries(self) -> List[Tuple[str, Dict[str, Any]]]:
+        with self._lock:
+            rows = self._conn.execute("SELECT doc_path, data FROM pending_writes ORDER BY created_at").fetchall()
+        return [(doc_path, json.loads(data)) for doc_path, data in rows]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM pending_writes").fetchone()[0]
+
+
+class BatchWriter:
+    """Process-wide write buffer that groups document sets into WriteBatch commits
+
+    A batch is committed as soon as MAX_BATCH_OPS writes are pending or
+    FLUSH_DELAY_SECONDS after the first write of the batch, whichever comes first.
+    With a `journal`, writes survive restarts and are retried until they commit
+    instead of being dropped. With `create_only`, a write never replaces a
+    document someone else wrote first: a late retry or replay keeps theirs.
+    """
+
+    def __init__(self, db_getter, name: str, max_ops: int = MAX_BATCH_OPS,
+                 flush_delay: float = FLUSH_DELAY_SECONDS, journal: Optional[WriteJournal] = None,
+                 create_only: bool = False):
+        self._db_getter = db_getter
+        self.max_ops = max_ops
+        self.flush_delay = flush_delay
+        self.journal = journal
+        self.create_only = create_only
+        self._pending: List[Tuple[Any, Dict[str, Any]]] = []
+        self._retry: List[Tuple[Any, Dict[str, Any]]] = []
+        self._wake: Optional[asyncio.Event] = None
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+        self.batch_size = registry.histogram(
+            f"{name}_batch_size", [1, 5, 10, 25, 50, 100, 250, 500], "Writes per committed batch")
+        self.flush_latency = registry.histogram(
+            f"{name}_flush_seconds", LATENCY_BUCKETS, "Batch commit latency")
+        self.failed_writes = registry.counter(f"{name}_failed_writes", "Writes dropped after retries")
+        registry.gauge(f"{name}_pending", "Writes waiting to be committed",
+                       fn=lambda: len(self._pending) + len(self._retry))
+
+    def add(self, ref, data: Dict[str, Any]):
+        """Queue `ref.set(data)` (or `ref.create(data)` with create_only); returns immediately"""
+        if self._task is None:
+            # Not started (e.g. one-off scripts): fall back to a direct write
+            self._write(self._db_getter(), [(ref, data)])
+            return
+        if self.journal is not None:
+            self.journal.append(ref.path, data)
+        self._pending.append((ref, data))
+        if len(self._pending) >= self.max_ops:
+            self._wake.set()
+        else:
+            self._schedule(self.flush_delay)
+
+    def has_pending(self) -> bool:
+        """True while any write is buffered, awaiting retry, or being committed"""
+        return bool(self._pending or self._retry) or self._flush_lock.locked()
+
+    def _schedule(self, delay: float):
+        if self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(delay, self._wake.set)
+
+    def _write(self, db, chunk: List[Tuple[Any, Dict[str, Any]]]):
+        batch = db.batch()
+        for ref, data in chunk:
+            if self.create_only:
+                batch.create(ref, data)
+            else:
+                batch.set(ref, data)
+        try:
+            batch.commit()
+        except AlreadyExists:
+            if not self.create_only:
+                raise
+            # One existing document fails the whole batch; create the rest one by one
+            for ref, data in chunk:
+                try:
+                    ref.create(data)
+                except AlreadyExists:
+                    pass
+
+    async def _commit(self, chunk: List[Tuple[Any, Dict[str, Any]]]):
+        db = self._db_getter()
+        for attempt in range(1, MAX_COMMIT_ATTEMPTS + 1):
+            start = time.perf_counter()
+            try:
+                await run_db(self._write, db, chunk)
+            except Exception as e:
+                print(f"⚠️ Batch commit failed (attempt {attempt}/{MAX_COMMIT_ATTEMPTS}): {str(e)}")
+                await asyncio.sleep(0.1 * 2 ** attempt)
+                continue
+            self.flush_latency.observe(time.perf_counter() - start)
+            self.batch_size.observe(len(chunk))
+            if self.journal is not None:
+                self.journal.remove([ref.path for ref, _ in chunk])
+            return
+        if self.journal is not None:
+            # Journaled writes are never dropped: keep them and try again later
+            print(f"⚠️ Keeping {len(chunk)} journaled writes for retry in {JOURNAL_RETRY_SECONDS}s")
+            self._retry.extend(chunk)
+            return
+        self.failed_writes.inc(len(chunk))
+        print(f"❌ Dropped {len(chunk)} writes: {[ref.id for ref, _ in chunk]}")
+
+    async def flush(self):
+        """Commit everything that is pending right now, including a flush already in progress"""
+        async with self._flush_lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            while self._pending:
+                chunk = self._pending[:self.max_ops]
+                del self._pending[:self.max_ops]
+                await self._commit(chunk)
+            if self._retry:
+                self._pending, self._retry = self._retry, []
+                if self._task is not None:
+                    self._schedule(JOURNAL_RETRY_SECONDS)
+
+    async def _run(self):
+        while True:
+            await self._wake.wait()
+            self._wake.clear()
+            await self.flush()
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._wake = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+            if self.journal is not None:
+                self._replay()
+
+    def _replay(self):
+        """Queue writes a previous process acknowledged but never committed"""
+        entries = self.journal.entries()
+        if not entries:
+            return
+        db = self._db_getter()
+        self._pending.extend((db.document(doc_path), data) for doc_path, data in entries)
+        print(f"🔄 Replaying {len(entries)} journaled writes")
+        self._wake.set()
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
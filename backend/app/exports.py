@@ -0,0 +1,89 @@
+import csv
+import io
+import json
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, Optional
+
+from .firestore_io import run_db
+from .pagination import fetch_page
+
+EXPORT_PAGE_SIZE = 500
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+TRANSACTION_COLUMNS = ["transactionId", "timestamp", "type", "amount", "status", "metadata"]
+INVESTMENT_COLUMNS = [
+    "investmentId", "timestamp", "amount", "status", "recurring", "frequency",
+    "nextRecurringDate", "paymentId", "refundAmount",
+]
+
+
+def _json_default(value: Any):
+    # Firestore timestamps and other non-JSON values
+    return value.isoformat() if hasattr(value, "isoformat") else str(value)
+
+
+class NDJSONEncoder:
+    def header(self) -> Optional[str]:
+        return None
+
+    def row(self, data: Dict[str, Any]) -> str:
+        return json.dumps(data, default=_json_default, separators=(",", ":")) + "\n"
+
+
+class CSVEncoder:
+    def __init__(self, columns: List[str]):
+        self.columns = columns
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer)
+
+    def _encode(self, values: Iterable[Any]) -> str:
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        self._writer.writerow(values)
+        return self._buffer.getvalue()
+
+    def header(self) -> Optional[str]:
+        return self._encode(self.columns)
+
+    def row(self, data: Dict[str, Any]) -> str:
+        values = []
+        for column in self.columns:
+            value = data.get(column)
+            if isinstance(value, (dict, list)):
+                value = json.dumps(value, default=_json_default, separators=(",", ":"))
+            elif value is None:
+                value = ""
+            values.append(value)
+        return self._encode(values)
+
+
+def make_encoder(fmt: str, columns: List[str]):
+    return CSVEncoder(columns) if fmt == "csv" else NDJSONEncoder()
+
+
+async def export_rows(page_source: Callable[[Optional[str]], Any], encoder) -> AsyncIterator[str]:
+    """Encode rows page by page; only one page is held in memory at a time
+
+    `page_source(cursor)` must return `(rows, next_cursor)` where rows are dicts.
+    """
+    header = encoder.header()
+    if header:
+        yield header
+    cursor = None
+    while True:
+        rows, cursor = await page_source(cursor)
+        # One chunk per page keeps the number of socket writes low
+        yield "".join(encoder.row(row) for row in rows)
+        if not cursor:
+            return
+
+
+def firestore_pages(query, page_size: int = EXPORT_PAGE_SIZE):
+    """Page source over a Firestore query ordered newest first"""
+    async def source(cursor: Optional[str]):
+        docs, next_cursor = await run_db(fetch_page, query, page_size, cursor)
+        return [doc.to_dict() for doc in docs], next_cursor
+    return source
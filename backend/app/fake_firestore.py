@@ -0,0 +1,307 @@
+import copy
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from google.api_core.exceptions import AlreadyExists, NotFound
+from google.cloud.firestore_v1.transforms import Increment
+
+DOCUMENT_ID = "__name__"
+
+OPERATORS = {
+    "==": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    "<": lambda a, b: a is not None and a < b,
+    "<=": lambda a, b: a is not None and a <= b,
+    ">": lambda a, b: a is not None and a > b,
+    ">=": lambda a, b: a is not None and a >= b,
+    "in": lambda a, b: a in b,
+    "array_contains": lambda a, b: isinstance(a, list) and b in a,
+}
+
+
+def _get_path(data: Dict[str, Any], path: str):
+    for part in path.split("."):
+        if not isinstance(data, dict) or part not in data:
+            return None
+        data = data[part]
+    return data
+
+
+def _set_path(data: Dict[str, Any], path: str, value: Any):
+    parts = path.split(".")
+    for part in parts[:-1]:
+        data = data.setdefault(part, {})
+    current = data.get(parts[-1])
+    if isinstance(value, Increment):
+        value = (current or 0) + value.value
+    data[parts[-1]] = value
+
+
+def _merge(target: Dict[str, Any], source: Dict[str, Any]):
+    for key, value in source.items():
+        if isinstance(value, dict):
+            if not isinstance(target.get(key), dict):
+                target[key] = {}
+            _merge(target[key], value)
+        elif isinstance(value, Increment):
+            target[key] = (target.get(key) or 0) + value.value
+        else:
+            target[key] = copy.deepcopy(value)
+
+
+class FakeSnapshot:
+    def __init__(self, reference: "FakeDocument", data: Optional[Dict[str, Any]]):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+
+    @property
+    def exists(self) -> bool:
+        return self._data is not None
+
+    def to_dict(self) -> Optional[Dict[str, Any]]:
+        return copy.deepcopy(self._data)
+
+    def get(self, field: str):
+        return self.id if field == DOCUMENT_ID else _get_path(self._data or {}, field)
+
+
+class FakeDocument:
+    def __init__(self, db: "FakeFirestore", collection: str, doc_id: str):
+        self._db = db
+        self.collection_name = collection
+        self.id = doc_id
+
+    @property
+    def path(self) -> str:
+        return f"{self.collection_name}/{self.id}"
+
+    def get(self, transaction: Optional["FakeTransaction"] = None) -> FakeSnapshot:
+        self._db._rpc(reads=1)
+        return self._db._snapshot(self)
+
+    def set(self, data: Dict[str, Any], merge: bool = False):
+        batch = self._db.batch()
+        batch.set(self, data, merge=merge)
+        batch.commit()
+
+    def update(self, data: Dict[str, Any]):
+        batch = self._db.batch()
+        batch.update(self, data)
+        batch.commit()
+
+    def create(self, data: Dict[str, Any]):
+        batch = self._db.batch()
+        batch.create(self, data)
+        batch.commit()
+
+    def delete(self):
+        batch = self._db.batch()
+        batch.delete(self)
+        batch.commit()
+
+
+class FakeQuery:
+    def __init__(self, db: "FakeFirestore", collection: str):
+        self._db = db
+        self._collection = collection
+        self._filters: List[tuple] = []
+        self._orders: List[tuple] = []
+        self._limit: Optional[int] = None
+        self._start_after: Optional[List[Any]] = None
+
+    def _copy(self) -> "FakeQuery":
+        query = copy.copy(self)
+        query._filters, query._orders = list(self._filters), list(self._orders)
+        return query
+
+    def where(self, field: str, op: str, value: Any) -> "FakeQuery":
+        query = self._copy()
+        query._filters.append((field, OPERATORS[op], value))
+        return query
+
+    def order_by(self, field: str, direction: str = "ASCENDING") -> "FakeQuery":
+        query = self._copy()
+        query._orders.append((field, direction == "DESCENDING"))
+        return query
+
+    def select(self, fields: List[str]) -> "FakeQuery":
+        return self
+
+    def limit(self, count: int) -> "FakeQuery":
+        query = self._copy()
+        query._limit = count
+        return query
+
+    def start_after(self, values) -> "FakeQuery":
+        query = self._copy()
+        if isinstance(values, dict):
+            values = [values[field] for field, _ in self._orders]
+        query._start_after = list(values)
+        return query
+
+    def _key(self, snapshot: FakeSnapshot):
+        return [snapshot.get(field) for field, _ in self._orders]
+
+    def _after_cursor(self, snapshot: FakeSnapshot) -> bool:
+        for (field, descending), value, bound in zip(self._orders, self._key(snapshot), self._start_after):
+            if value == bound:
+                continue
+            return (value < bound) if descending else (value > bound)
+        return False
+
+    def stream(self):
+        with self._db._lock:
+            docs = [FakeSnapshot(FakeDocument(self._db, self._collection, doc_id), copy.deepcopy(data))
+                    for doc_id, data in self._db._store.get(self._collection, {}).items()]
+        docs = [d for d in docs if all(op(d.get(field), value) for field, op, value in self._filters)]
+        for field, descending in reversed(self._orders):
+            docs.sort(key=lambda d: (d.get(field) is not None, d.get(field)), reverse=descending)
+        if self._start_after is not None:
+            docs = [d for d in docs if self._after_cursor(d)]
+        if self._limit is not None:
+            docs = docs[:self._limit]
+        self._db._rpc(reads=max(1, len(docs)))  # an empty result is billed as one read
+        return iter(docs)
+
+    def get(self):
+        return list(self.stream())
+
+
+class FakeCollection(FakeQuery):
+    def document(self, doc_id: Optional[str] = None) -> FakeDocument:
+        return FakeDocument(self._db, self._collection, doc_id or uuid.uuid4().hex)
+
+
+class FakeBatch:
+    def __init__(self, db: "FakeFirestore"):
+        self._db = db
+        self._writes: List[tuple] = []
+
+    def set(self, ref: FakeDocument, data: Dict[str, Any], merge: bool = False):
+        self._writes.append(("set_merge" if merge else "set", ref, data))
+
+    def update(self, ref: FakeDocument, data: Dict[str, Any]):
+        self._writes.append(("update", ref, data))
+
+    def create(self, ref: FakeDocument, data: Dict[str, Any]):
+        self._writes.append(("create", ref, data))
+
+    def delete(self, ref: FakeDocument):
+        self._writes.append(("delete", ref, None))
+
+    def commit(self):
+        self._db._rpc(writes=len(self._writes))
+        with self._db._write_lock, self._db._lock:
+            # Validate first so a failing batch leaves nothing behind, like the real thing
+            for kind, ref, _ in self._writes:
+                exists = ref.id in self._db._store.get(ref.collection_name, {})
+                if kind == "update" and not exists:
+                    raise NotFound(f"No document to update: {ref.path}")
+                if kind == "create" and exists:
+                    raise AlreadyExists(f"Document already exists: {ref.path}")
+            for kind, ref, data in self._writes:
+                collection = self._db._store.setdefault(ref.collection_name, {})
+                if kind == "delete":
+                    collection.pop(ref.id, None)
+                elif kind in ("set", "create"):
+                    collection[ref.id] = {}
+                    _merge(collection[ref.id], data)
+                elif kind == "set_merge":
+                    _merge(collection.setdefault(ref.id, {}), data)
+                else:
+                    for path, value in data.items():
+                        _set_path(collection[ref.id], path, copy.deepcopy(value))
+        self._writes = []
+
+
+class FakeTransaction(FakeBatch):
+    """Works with @firestore.transactional: holds the client's write lock from begin to commit
+
+    That serializes transactions with each other and with batch commits, like
+    Firestore's pessimistic locking, so reads inside one can't go stale.
+    """
+
+    _read_only = False
+    _max_attempts = 5
+
+    def __init__(self, db: "FakeFirestore"):
+        super().__init__(db)
+        self._id: Optional[str] = None
+
+    def _clean_up(self):
+        self._writes = []
+        self._id = None
+
+    def _begin(self, retry_id: Optional[str] = None):
+        self._db._write_lock.acquire()
+        self._id = uuid.uuid4().hex
+
+    def _commit(self):
+        try:
+            self.commit()
+        finally:
+            self._release()
+
+    def _rollback(self):
+        self._writes = []
+        self._release()
+
+    def _release(self):
+        if self._id is not None:
+            self._id = None
+            self._db._write_lock.release()
+
+
+class FakeFirestore:
+    """In-memory, thread-safe stand-in for the Firestore client, for offline benchmarks
+
+    Covers the subset of the API this app uses: documents, batches,
+    transactions, and simple filtered/ordered/limited queries. Every round trip is counted in `ops`
+    (rpcs, reads, writes) and can be slowed down with `latency` to mimic the network.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self._store: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+        # Held by transactions from begin to commit; batches take it to commit
+        self._write_lock = threading.RLock()
+        self.ops: Dict[str, int] = {"rpcs": 0, "reads": 0, "writes": 0}
+
+    def _rpc(self, reads: int = 0, writes: int = 0):
+        with self._lock:
+            self.ops["rpcs"] += 1
+            self.ops["reads"] += reads
+            self.ops["writes"] += writes
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _snapshot(self, ref: FakeDocument) -> FakeSnapshot:
+        with self._lock:
+            data = self._store.get(ref.collection_name, {}).get(ref.id)
+            return FakeSnapshot(ref, copy.deepcopy(data))
+
+    def collection(self, name: str) -> FakeCollection:
+        return FakeCollection(self, name)
+
+    def document(self, path: str) -> FakeDocument:
+        collection, doc_id = path.rsplit("/", 1)
+        return FakeDocument(self, collection, doc_id)
+
+    def batch(self) -> FakeBatch:
+        return FakeBatch(self)
+
+    def transaction(self) -> FakeTransaction:
+        return FakeTransaction(self)
+
+    def seed(self, collection: str, doc_id: str, data: Dict[str, Any]):
+        """Insert a document without counting it as an operation"""
+        with self._lock:
+            self._store.setdefault(collection, {})[doc_id] = copy.deepcopy(data)
+
+    def count(self, collection: str) -> int:
+        with self._lock:
+            return len(self._store.get(collection, {}))
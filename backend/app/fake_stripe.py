@@ -0,0 +1,39 @@
+import time
+from typing import Any, Dict, Optional
+
+import stripe
+
+
+class FakeStripeClient:
+    """In-memory stand-in for StripeClient, for tests and offline benchmarks
+
+    Register objects with add_payment_intent/add_customer; retrieves return
+    StripeObjects like the real library. Every retrieve is counted in `calls`
+    and can be slowed down with `latency` to mimic the network.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.payment_intents: Dict[str, Dict[str, Any]] = {}
+        self.customers: Dict[str, Dict[str, Any]] = {}
+        self.calls: Dict[str, int] = {"payment_intent": 0, "customer": 0}
+
+    def add_payment_intent(self, payment_intent_id: str, metadata: Optional[dict] = None, **fields):
+        self.payment_intents[payment_intent_id] = {"id": payment_intent_id, "metadata": metadata or {}, **fields}
+
+    def add_customer(self, customer_id: str, metadata: Optional[dict] = None, **fields):
+        self.customers[customer_id] = {"id": customer_id, "metadata": metadata or {}, **fields}
+
+    def _retrieve(self, store: Dict[str, Dict[str, Any]], kind: str, object_id: str):
+        self.calls[kind] += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if object_id not in store:
+            raise LookupError(f"No such {kind}: {object_id}")
+        return stripe.StripeObject.construct_from(store[object_id], "sk_test_fake")
+
+    def retrieve_payment_intent(self, payment_intent_id: str):
+        return self._retrieve(self.payment_intents, "payment_intent", payment_intent_id)
+
+    def retrieve_customer(self, customer_id: str):
+        return self._retrieve(self.customers, "customer", customer_id)
@@ -0,0 +1,26 @@
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List
+
+# The Firestore client is synchronous (gRPC under the hood), so every call is
+# offloaded to a dedicated pool instead of blocking the event loop.
+FIRESTORE_IO_WORKERS = int(os.getenv("FIRESTORE_IO_WORKERS", "32"))
+
+_executor = ThreadPoolExecutor(max_workers=FIRESTORE_IO_WORKERS, thread_name_prefix="firestore-io")
+
+
+async def run_db(fn: Callable, *args, **kwargs) -> Any:
+    """Run a blocking Firestore call on the I/O pool and await its result"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(fn, *args, **kwargs))
+
+
+async def stream_all(query) -> List[Any]:
+    """Materialize a Firestore query stream without blocking the event loop"""
+    return await run_db(lambda: list(query.stream()))
+
+
+def shutdown_io(wait: bool = True):
+    _executor.shutdown(wait=wait)
@@ -0,0 +1,65 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict
+
+from google.api_core.exceptions import AlreadyExists
+
+from .firestore_io import run_db
+from .metrics import registry
+
+SEEN_EVENTS_SIZE = int(os.getenv("WEBHOOK_SEEN_EVENTS_SIZE", "100000"))
+
+
+class EventIdempotency:
+    """Claims webhook event IDs exactly once
+
+    Recently seen IDs are answered from an in-memory LRU with no network call.
+    Everything else is claimed with a single Firestore `create()`, which fails
+    if the doc already exists, so concurrent deliveries cannot both win.
+    """
+
+    def __init__(self, db_getter, collection: str = "webhookEvents", max_size: int = SEEN_EVENTS_SIZE):
+        self._db_getter = db_getter
+        self.collection = collection
+        self.max_size = max_size
+        self._seen: "OrderedDict[str, None]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.local_duplicates = registry.counter("webhook_duplicates_local", "Duplicates rejected from memory")
+        self.remote_duplicates = registry.counter("webhook_duplicates_remote", "Duplicates rejected by Firestore")
+
+    def seen(self, event_id: str) -> bool:
+        with self._lock:
+            if event_id in self._seen:
+                self._seen.move_to_end(event_id)
+                return True
+            return False
+
+    def remember(self, event_id: str):
+        with self._lock:
+            self._seen[event_id] = None
+            self._seen.move_to_end(event_id)
+            while len(self._seen) > self.max_size:
+                self._seen.popitem(last=False)
+
+    async def claim(self, event_id: str, record: Dict[str, Any]) -> bool:
+        """Return True if this call claimed the event, False if it was already claimed"""
+        if self.seen(event_id):
+            self.local_duplicates.inc()
+            return False
+        ref = self._db_getter().collection(self.collection).document(event_id)
+        try:
+            await run_db(ref.create, record)
+        except AlreadyExists:
+            self.remember(event_id)
+            self.remote_duplicates.inc()
+            return False
+        self.remember(event_id)
+        return True
+
+    async def release(self, event_id: str):
+        """Undo a claim whose processing failed, so a retry or replay can claim it again"""
+        with self._lock:
+            self._seen.pop(event_id, None)
+        ref = self._db_getter().collection(self.collection).document(event_id)
+        await run_db(ref.delete)
@@ -1,25 +1,45 @@
-from fastapi import FastAPI, HTTPException, Depends, Header, Request, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Depends, Header, Query, Request, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
 from pathlib import Path
-import joblib
-import numpy as np
 import firebase_admin
-from firebase_admin import credentials, firestore, auth
+from firebase_admin import credentials, firestore
+from google.api_core.exceptions import NotFound
 import stripe
-import pickle
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 import uuid
 import os
 import json
+import asyncio
 from decimal import Decimal
 import uvicorn
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from dotenv import load_dotenv
 
 load_dotenv()
 
+from .token_cache import verify_id_token_cached, cert_refresher
+from .firestore_io import run_db, stream_all, shutdown_io
+from .valuation import Positions, value_positions, value_portfolios, summarize
+from .portfolio_aggregate import (apply_position, effective_amount, ensure_aggregate, principal_positions,
+                                  read_portfolio)
+from .write_behind import FinancialInfoWriter
+from .batch_writer import BatchWriter, WriteJournal
+from .metrics import StageTimer, registry
+from .webhook_queue import WebhookQueue, WebhookWorkerPool
+from .idempotency import EventIdempotency
+from .stripe_lookup import StripeLookup, metadata_with
+from .webhook_storage import WebhookArchive, compact_error_record, compact_event_record
+from .stripe_client import AsyncStripe
+from .recurring import first_recurring_date
+from . import withdrawals
+from .inference import (MAX_BATCH_ROWS, MODEL_FILES, SAVINGS_FEATURES, WITHDRAWAL_FEATURES, InferencePool,
+                        MicroBatcher, ModelLoader, batch_results, feature_matrix, feature_row)
+from .portfolio_history import INTERVALS, build_series, history_cache
+from .pagination import fetch_page
+from .exports import INVESTMENT_COLUMNS, MEDIA_TYPES, TRANSACTION_COLUMNS, export_rows, firestore_pages, make_encoder
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Savium Investment API", 
@@ -44,11 +64,42 @@ try:
 except Exception as e:
     print(f"Error initializing Firebase: {e}")
 
+# financialInfo snapshots written behind the read endpoints
+financial_info_writer = FinancialInfoWriter(lambda: db)
+
+# Ledger lines from save_transaction, committed in batches
+transaction_buffer = BatchWriter(lambda: db, "transaction_writes")
+
+# Pending deposit records from /api/deposit, journaled locally until committed.
+# Create-only, so a late retry or replay can't reset a deposit the webhook already completed
+DEPOSIT_JOURNAL_PATH = os.getenv("DEPOSIT_JOURNAL_PATH", "deposit_journal.db")
+deposit_writer = BatchWriter(lambda: db, "deposit_writes", journal=WriteJournal(DEPOSIT_JOURNAL_PATH),
+                             create_only=True)
+
 # Initialize Stripe
 STRIPE_API_KEY = os.getenv("STRIPE_API_KEY", "sk_test_your_test_key")
 stripe.api_key = STRIPE_API_KEY
 STRIPE_WEBHOOK_SECRET = os.getenv("STRIPE_WEBHOOK_SECRET", "whsec_your_webhook_secret")
 
+# Shared keep-alive client for Stripe calls made from request handlers
+stripe_async = AsyncStripe(STRIPE_API_KEY)
+
+# Cached metadata lookups for Stripe objects referenced by webhooks
+stripe_lookup = StripeLookup()
+
+# Full webhook payloads are archived locally; Firestore keeps compact, expiring records
+webhook_archive = WebhookArchive()
+
+# Exactly-once claims on webhook event IDs
+webhook_idempotency = EventIdempotency(lambda: db)
+
+# "inline" processes webhooks in the request; "queue" acknowledges and processes in the background
+WEBHOOK_MODE = os.getenv("WEBHOOK_MODE", "inline")
+webhook_queue = WebhookQueue() if WEBHOOK_MODE == "queue" else None
+webhook_workers = (
+    WebhookWorkerPool(webhook_queue, lambda payload: process_queued_event(payload)) if webhook_queue else None
+)
+
 # Economic constants (hardcoded)
 INFLATION_RATE = 0.025  # 2.5% inflation rate
 INTEREST_PREMIUM = 0.015  # 1.5% premium over inflation
@@ -86,35 +137,17 @@ MODELS: Dict[str, Any] = {
 }
 
 # --- Model Loading ---
-def load_ml_models():
-    """Load models from services/models/ directory"""
-    try:
-        # Load XGBoost withdrawal model (.joblib)
-        MODELS["withdrawal"] = joblib.load("app/services/models/xgb_withdrawal_model.joblib")
-        
-        # Load RandomForest models (.pkl)
-        MODELS["savings_salaried"] = pickle.load(open("app/services/models/rf_model_salaried.pkl", "rb"))
-        MODELS["savings_self_employed"] = pickle.load(open("app/services/models/rf_model_self_employed.pkl", "rb"))
-        MODELS["savings_student"] = pickle.load(open("app/services/models/rf_model_student.pkl", "rb"))
-        
-        print("✅ All models loaded successfully from services/models/")
-        print(f"Loaded models: {list(MODELS.keys())}")
-        
-    except FileNotFoundError as e:
-        print(f"❌ Model file not found: {str(e)}")
-        print("Please ensure:")
-        print("1. The 'services/models/' directory exists")
-        print("2. All model files are present in the directory")
-        print("3. File names match exactly (including extensions)")
-        raise
-    except Exception as e:
-        print(f"❌ Error loading models: {str(e)}")
-        raise
+# Models load concurrently in the background (or on first use with
+# INFERENCE_LAZY_MODELS); /api/ready reports which ones are available
+model_loader = ModelLoader(MODELS)
+# Keeps start-up tasks referenced until they finish
+startup_tasks: set = set()
+
 # --- Helper Functions ---
 
 def verify_token(id_token: str):
     try:
-        decoded_token = auth.verify_id_token(id_token)
+        decoded_token = verify_id_token_cached(id_token)
         return decoded_token
     except Exception as e:
         print(f"Token verification failed: {e}")
@@ -125,7 +158,7 @@ async def get_current_user(authorization: str = Header(...)):
     """Verify Firebase token and get current user"""
     try:
         token = authorization.split("Bearer ")[1]
-        decoded_token = auth.verify_id_token(token)
+        decoded_token = verify_id_token_cached(token)
         return decoded_token
     except Exception as e:
         raise HTTPException(status_code=401, detail=f"Invalid authentication: {str(e)}")
@@ -137,43 +170,27 @@ def calculate_investment_returns(principal: float, days: int) -> float:
 def get_portfolio_value(user_id: str) -> dict:
     """Get current portfolio value and returns for a user"""
     try:
-        # Get user's investments from Firestore
-        investments_ref = db.collection("investments").where("userId", "==", user_id).stream()
-        
-        total_invested = 0.0
-        current_value = 0.0
-        
-        for inv in investments_ref:
-            inv_data = inv.to_dict()
-            amount = inv_data.get("amount", 0)
-            timestamp = inv_data.get("timestamp", datetime.now())
-            
-            # Convert timestamp to datetime if needed
-            if isinstance(timestamp, str):
-                timestamp = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
-                
-            days_invested = (datetime.now() - timestamp).days
-            returns = calculate_investment_returns(amount, days_invested)
-            
-            total_invested += amount
-            current_value += amount + returns
-        
-        return {
-            "total_invested": round(total_invested, 2),
-            "current_value": round(current_value, 2),
-            "total_returns": round(current_value - total_invested, 2),
-            "return_percentage": round(((current_value / total_invested) - 1) * 100, 2) if total_invested > 0 else 0.0,
-            "annual_rate": round(ANNUAL_INTEREST_RATE * 100, 2)
-        }
+        # Single read of the materialized aggregate (see portfolio_aggregate.py)
+        return read_portfolio(db, user_id, DAILY_INTEREST_RATE, ANNUAL_INTEREST_RATE)
     except Exception as e:
         print(f"Error calculating portfolio value: {str(e)}")
-        return {
-            "total_invested": 0.0,
-            "current_value": 0.0,
-            "total_returns": 0.0,
-            "return_percentage": 0.0,
-            "annual_rate": round(ANNUAL_INTEREST_RATE * 100, 2)
-        }
+        return summarize(0.0, 0.0, ANNUAL_INTEREST_RATE)
+
+def get_portfolio_values(user_ids: List[str]) -> Dict[str, dict]:
+    """Get portfolio values for many users at once (bulk mode)
+
+    Values the same principal as the per-user aggregate: refunds and failed
+    payments are excluded and completed withdrawals subtracted.
+    """
+    investments, withdrawals = [], []
+    # Firestore "in" queries accept at most 30 values
+    for i in range(0, len(user_ids), 30):
+        chunk = user_ids[i:i + 30]
+        investments.extend(d.to_dict() for d in db.collection("investments").where("userId", "in", chunk).stream())
+        withdrawals.extend(d.to_dict() for d in db.collection("withdrawals").where("userId", "in", chunk).stream())
+    positions = principal_positions(investments, withdrawals)
+    portfolios = value_portfolios(positions, DAILY_INTEREST_RATE, ANNUAL_INTEREST_RATE)
+    return {uid: portfolios.get(uid, summarize(0.0, 0.0, ANNUAL_INTEREST_RATE)) for uid in user_ids}
 
 async def save_transaction(user_id: str, transaction_type: str, amount: float, status: str, metadata: dict = None):
     """Save transaction to Firestore"""
@@ -188,62 +205,62 @@ async def save_transaction(user_id: str, transaction_type: str, amount: float, s
         "metadata": metadata or {}
     }
     
-    db.collection("transactions").document(transaction_id).set(transaction_data)
+    transaction_buffer.add(db.collection("transactions").document(transaction_id), transaction_data)
     return transaction_id
 
 # --- ML Service Functions ---
 
 @app.on_event("startup")
 async def startup_event():
-    """Load ML models when application starts"""
-    load_ml_models()
+    """Start loading ML models and background workers"""
+    if not model_loader.lazy:
+        model_loader.start()
+    # Process workers load their own copies, which can take as long as the models above
+    pool_start = asyncio.create_task(
+        asyncio.to_thread(inference_pool.start, [] if model_loader.lazy else list(MODEL_FILES)))
+    startup_tasks.add(pool_start)
+    pool_start.add_done_callback(startup_tasks.discard)
+    cert_refresher.start()
+    financial_info_writer.start()
+    transaction_buffer.start()
+    deposit_writer.start()
+    if webhook_workers:
+        webhook_workers.start()
 
-# --- Helper Functions ---
-def prepare_withdrawal_input(features: dict) -> np.ndarray:
-    return np.array([
-        features["net_monthly_income"],
-        features["monthly_fixed_expenses"],
-        features["income_to_spend_ratio"],
-        features["transaction_amount"],
-        features["days_since_last_salary"],
-        features["avg_monthly_spend"],
-        features["last_7_days_spend"],
-        features["current_balance"],
-        features["days_since_last_withdrawal"],
-        features["recent_large_expense"],
-    ]).reshape(1, -1)
-
-def prepare_savings_input(features: dict) -> np.ndarray:
-    return np.array([
-        features["net_monthly_income"],
-        features["monthly_fixed_expenses"],
-        features["income_to_spend_ratio"],
-        features["transaction_amount"],
-        features["round_off_diff"],
-        features["balance_after_transaction"],
-        features["days_since_last_salary"],
-        features["avg_monthly_spend"],
-        features["last_7_days_spend"],
-        features["current_balance"],
-        features["has_upcoming_bill"],
-        features["days_since_last_withdrawal"],
-        features["recent_large_expense"],
-    ]).reshape(1, -1)
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop background workers"""
+    cert_refresher.stop()
+    await financial_info_writer.stop()
+    if webhook_workers:
+        await webhook_workers.stop()
+    await transaction_buffer.stop()
+    await deposit_writer.stop()
+    inference_pool.shutdown()
+    await stripe_async.aclose()
+    shutdown_io()
 
 # --- Prediction Endpoints ---
 
+# Predictions run in a thread/process pool, off the event loop (INFERENCE_EXECUTOR)
+inference_pool = InferencePool(MODELS)
+
+# Concurrent single-row requests are scored together (see inference.MicroBatcher)
+withdrawal_batcher = MicroBatcher("withdrawal", lambda rows: inference_pool.predict("withdrawal", rows))
+savings_batcher = MicroBatcher("savings", lambda rows: inference_pool.predict("savings_student", rows))
+
 @app.post("/api/predict/withdrawal")
 async def predict_withdrawal(features: dict):
     try:
-        model = MODELS.get("withdrawal")
-        if not model:
+        if not await model_loader.ensure("withdrawal"):
             raise HTTPException(status_code=503, detail="Withdrawal model not loaded")
 
-        input_array = prepare_withdrawal_input(features)
-        prediction = model.predict(input_array)  # Returns a NumPy array
-        decision = int(prediction[0])   # 0 or 1
+        prediction = await withdrawal_batcher.predict(feature_row(features, WITHDRAWAL_FEATURES))
+        decision = int(prediction)   # 0 or 1
         return {"can_withdraw": decision}
 
+    except HTTPException:
+        raise
     except KeyError as e:
         raise HTTPException(status_code=400, detail=f"Missing feature: {str(e)}")
     except Exception as e:
@@ -252,23 +269,57 @@ async def predict_withdrawal(features: dict):
 @app.post("/api/predict/savings")
 async def predict_savings(features: dict):
     try:
-        model = MODELS.get("savings_student")  # Pick one or handle all three types dynamically
-        if not model:
+        # Pick one or handle all three types dynamically
+        if not await model_loader.ensure("savings_student"):
             raise HTTPException(status_code=503, detail="Savings model not loaded")
 
-        print(f"Input features: {features}")  # Debugging: Log the input features
-        input_array = prepare_savings_input(features)
-        print(f"Input array: {input_array}")  # Debugging: Log the prepared input array
-
-        prediction = model.predict(input_array)  # Returns a NumPy array
-        decision = int(prediction[0])
+        prediction = await savings_batcher.predict(feature_row(features, SAVINGS_FEATURES))
+        decision = int(prediction)
         return {"save_decision": decision}
 
+    except HTTPException:
+        raise
     except KeyError as e:
         raise HTTPException(status_code=400, detail=f"Missing feature: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
+async def predict_batch(model_name: str, rows: List[Any], names: List[str], key: str) -> dict:
+    """Score every valid row with a single predict call; invalid rows get an error entry"""
+    if len(rows) > MAX_BATCH_ROWS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_ROWS} rows per batch")
+    matrix, indices, errors = feature_matrix(rows, names)
+    predictions = await inference_pool.predict(model_name, matrix) if len(indices) else None
+    return {
+        "results": batch_results(len(rows), indices, predictions, errors, key),
+        "scored": len(indices),
+        "failed": len(errors)
+    }
+
+@app.post("/api/predict/withdrawal/batch")
+async def predict_withdrawal_batch(rows: List[Any]):
+    """Score a list of feature dicts; results come back in input order, with an error for each bad row"""
+    if not await model_loader.ensure("withdrawal"):
+        raise HTTPException(status_code=503, detail="Withdrawal model not loaded")
+    try:
+        return await predict_batch("withdrawal", rows, WITHDRAWAL_FEATURES, "can_withdraw")
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/predict/savings/batch")
+async def predict_savings_batch(rows: List[Any]):
+    """Score a list of feature dicts; results come back in input order, with an error for each bad row"""
+    if not await model_loader.ensure("savings_student"):
+        raise HTTPException(status_code=503, detail="Savings model not loaded")
+    try:
+        return await predict_batch("savings_student", rows, SAVINGS_FEATURES, "save_decision")
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    
 class TransactionService:
     @staticmethod
     def create_transaction(user_id: str, amount: float, description: str, payment_intent_id: str) -> dict:
@@ -300,6 +351,19 @@ async def root():
     """Health check endpoint"""
     return {"status": "Savium API is operational", "version": "1.0.0"}
 
+@app.get("/api/metrics")
+async def get_metrics():
+    """Internal counters, gauges and histograms"""
+    return registry.snapshot()
+
+@app.get("/api/ready")
+async def readiness():
+    """Readiness probe: 503 until eager model loading and the inference pool are up; lists each model's state"""
+    ready = model_loader.ready() and inference_pool.started
+    return JSONResponse(status_code=200 if ready else 503,
+                        content={"ready": ready, "lazy": model_loader.lazy, "pool": inference_pool.started,
+                                 "models": model_loader.status()})
+
 # --- User Management Endpoints ---
 
 @app.post("/api/users")
@@ -308,11 +372,11 @@ async def create_user(user: UserCreate):
     try:
         # Check if user exists
         user_ref = db.collection("users").document(user.uid)
-        user_doc = user_ref.get()
+        user_doc = await run_db(user_ref.get)
         
         if user_doc.exists:
             # Update last login
-            user_ref.update({
+            await run_db(user_ref.update, {
                 "lastLogin": datetime.now().isoformat()
             })
             return {"message": "User login recorded", "userId": user.uid}
@@ -337,7 +401,7 @@ async def create_user(user: UserCreate):
                     "portfolioValue": 0
                 }
             }
-            user_ref.set(user_data)
+            await run_db(user_ref.set, user_data)
             return {"message": "User created successfully", "userId": user.uid}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error creating user: {str(e)}")
@@ -346,19 +410,19 @@ async def create_user(user: UserCreate):
 async def get_user_profile(user=Depends(get_current_user)):
     """Get current user's profile"""
     try:
-        user_ref = db.collection("users").document(user["uid"]).get()
+        user_ref = await run_db(db.collection("users").document(user["uid"]).get)
         if not user_ref.exists:
             raise HTTPException(status_code=404, detail="User not found")
         
         user_data = user_ref.to_dict()
-        portfolio = get_portfolio_value(user["uid"])
+        portfolio = await run_db(get_portfolio_value, user["uid"])
         
-        # Update financial information in user profile
-        db.collection("users").document(user["uid"]).update({
-            "financialInfo.totalInvested": portfolio["total_invested"],
-            "financialInfo.totalReturns": portfolio["total_returns"],
-            "financialInfo.portfolioValue": portfolio["current_value"]
-        })
+        # Update financial information in user profile (written behind, only if changed)
+        financial_info_writer.submit(user["uid"], {
+            "totalInvested": portfolio["total_invested"],
+            "totalReturns": portfolio["total_returns"],
+            "portfolioValue": portfolio["current_value"]
+        }, current=user_data.get("financialInfo", {}))
         
         # Add portfolio data to response
         user_data["portfolio"] = portfolio
@@ -388,11 +452,16 @@ async def create_investment(
             "status": "pending",
             "recurring": investment.recurring,
             "frequency": investment.frequency,
-            "nextRecurringDate": (datetime.now() + timedelta(days=30)).isoformat() if investment.recurring else None
+            "nextRecurringDate": first_recurring_date(investment.frequency) if investment.recurring else None
         }
         
-        # Save investment
-        db.collection("investments").document(investment_id).set(investment_data)
+        # Save investment and add it to the portfolio aggregate in one commit
+        await run_db(ensure_aggregate, db, user["uid"], DAILY_INTEREST_RATE)
+        batch = db.batch()
+        batch.set(db.collection("investments").document(investment_id), investment_data)
+        apply_position(db, user["uid"], investment.amount, timestamp, DAILY_INTEREST_RATE, batch=batch)
+        await run_db(batch.commit)
+        history_cache.invalidate(user["uid"])
         
         # Record transaction
         background_tasks.add_task(
@@ -416,31 +485,16 @@ async def create_investment(
 async def get_investments(user=Depends(get_current_user)):
     """Get all investments for current user"""
     try:
-        investments_ref = db.collection("investments").where("userId", "==", user["uid"]).stream()
+        investments_ref = await stream_all(db.collection("investments").where("userId", "==", user["uid"]))
+        investments = [inv.to_dict() for inv in investments_ref]
         
-        investments = []
-        for inv in investments_ref:
-            inv_data = inv.to_dict()
-            
-            # Calculate current value and returns
-            amount = inv_data.get("amount", 0)
-            timestamp = inv_data.get("timestamp")
-            
-            if timestamp:
-                if isinstance(timestamp, str):
-                    inv_timestamp = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
-                else:
-                    inv_timestamp = timestamp
-                    
-                days_invested = (datetime.now() - inv_timestamp).days
-                returns = calculate_investment_returns(amount, days_invested)
-                current_value = amount + returns
-                
-                inv_data["currentValue"] = round(current_value, 2)
-                inv_data["returns"] = round(returns, 2)
-                inv_data["daysInvested"] = days_invested
-            
-            investments.append(inv_data)
+        # Calculate current value and returns for all positions at once
+        valued = value_positions(Positions.from_docs(investments), DAILY_INTEREST_RATE)
+        for i, inv_data in enumerate(investments):
+            if valued["valid"][i]:
+                inv_data["currentValue"] = round(float(valued["current_value"][i]), 2)
+                inv_data["returns"] = round(float(valued["returns"][i]), 2)
+                inv_data["daysInvested"] = int(valued["days"][i])
             
         return {"investments": investments}
     except Exception as e:
@@ -450,19 +504,50 @@ async def get_investments(user=Depends(get_current_user)):
 async def get_user_portfolio(user=Depends(get_current_user)):
     """Get user's portfolio summary"""
     try:
-        portfolio = get_portfolio_value(user["uid"])
+        portfolio = await run_db(get_portfolio_value, user["uid"])
         
-        # Update user's financial info
-        db.collection("users").document(user["uid"]).update({
-            "financialInfo.totalInvested": portfolio["total_invested"],
-            "financialInfo.totalReturns": portfolio["total_returns"],
-            "financialInfo.portfolioValue": portfolio["current_value"]
+        # Update user's financial info (written behind, only if changed)
+        financial_info_writer.submit(user["uid"], {
+            "totalInvested": portfolio["total_invested"],
+            "totalReturns": portfolio["total_returns"],
+            "portfolioValue": portfolio["current_value"]
         })
         
         return portfolio
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching portfolio: {str(e)}")
 
+@app.get("/api/portfolio/history")
+async def get_portfolio_history(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    interval: str = "daily",
+    user=Depends(get_current_user)
+):
+    """Get portfolio value over time (daily, weekly or monthly points)"""
+    if interval not in INTERVALS:
+        raise HTTPException(status_code=400, detail=f"interval must be one of: {', '.join(INTERVALS)}")
+    end = end or date.today()
+    start = start or end - timedelta(days=90)
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    if interval == "daily" and (end - start).days > 366 * 5:
+        raise HTTPException(status_code=400, detail="Daily history is limited to 5 years")
+    
+    try:
+        key = (start, end, interval)
+        series = history_cache.get(user["uid"], key)
+        if series is None:
+            investments_ref = await stream_all(db.collection("investments").where("userId", "==", user["uid"]))
+            series = build_series(
+                (inv.to_dict() for inv in investments_ref), start, end, interval, DAILY_INTEREST_RATE
+            )
+            history_cache.put(user["uid"], key, series)
+        
+        return {"interval": interval, "annual_rate": round(ANNUAL_INTEREST_RATE * 100, 2), "points": series}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching portfolio history: {str(e)}")
+
 # --- Payment Endpoints ---
 
 @app.post("/api/payments/create-intent")
@@ -473,7 +558,7 @@ async def create_payment_intent(
     """Create a Stripe payment intent"""
     try:
         # Create payment intent
-        intent = stripe.PaymentIntent.create(
+        intent = await stripe_async.create_payment_intent(
             amount=payment_data.amount,  # Amount in cents
             currency=payment_data.currency,
             description=payment_data.description,
@@ -503,6 +588,8 @@ async def stripe_webhook(request: Request, background_tasks: BackgroundTasks):
     
     This endpoint receives events from Stripe about payment status changes,
     subscription updates, and other important account notifications.
+    With WEBHOOK_MODE=queue, verified events are persisted to the local
+    webhook queue and acknowledged immediately; a worker pool processes them.
     """
     # Get the webhook payload and signature header
     payload = await request.body()
@@ -513,63 +600,23 @@ async def stripe_webhook(request: Request, background_tasks: BackgroundTasks):
     
     try:
         # Verify the event came from Stripe using signature verification
-        event = stripe.Webhook.construct_event(
+        stripe.Webhook.construct_event(
             payload, sig_header, STRIPE_WEBHOOK_SECRET
         )
+        # Handlers work on plain dicts; StripeObject is no longer a dict subclass in stripe>=15
+        event = json.loads(payload)
         
-        # Extract the event type and data
-        event_type = event["type"]
-        event_data = event["data"]["object"]
-        
-        print(f"Processing Stripe webhook: {event_type}")
-        
-        # Check if we've already processed this event to avoid duplicates
-        event_id = event["id"]
-        webhook_event_ref = db.collection("webhookEvents").document(event_id)
-        webhook_doc = webhook_event_ref.get()
-        
-        if webhook_doc.exists:
-            print(f"Webhook event {event_id} already processed, skipping")
+        if webhook_idempotency.seen(event["id"]):
+            print(f"Webhook event {event['id']} already processed, skipping")
             return {"status": "success", "message": "Event already processed"}
         
-        # Store event in database to prevent duplicate processing
-        webhook_event_ref.set({
-            "eventId": event_id,
-            "type": event_type,
-            "processedAt": datetime.now().isoformat(),
-            "data": json.loads(json.dumps(event_data))  # Convert to JSON-serializable format
-        })
-        
-        # Handle different event types
-        if event_type == "payment_intent.succeeded":
-            # Handle successful payments
-            await handle_successful_payment(event_data, background_tasks)
-        elif event_type == "payment_intent.payment_failed":
-            # Handle failed payments
-            await handle_failed_payment(event_data, background_tasks)
-            
-        elif event_type == "charge.succeeded":
-            # Handle successful charges (for one-time payments)
-            await handle_successful_payment(event_data, background_tasks)
-        elif event_type == "charge.refunded":
-            # Handle refunds
-            await handle_refund(event_data, background_tasks)
-            
-        elif event_type == "customer.subscription.created":
-            # Handle new subscriptions (for recurring investments)
-            await handle_subscription_created(event_data, background_tasks)
-            
-        elif event_type == "customer.subscription.updated":
-            # Handle subscription updates
-            await handle_subscription_updated(event_data, background_tasks)
-            
-        elif event_type == "customer.subscription.deleted":
-            # Handle subscription cancellations
-            await handle_subscription_cancelled(event_data, background_tasks)
-            
-        # Add other event types as needed
+        if WEBHOOK_MODE == "queue":
+            # Acknowledge right away; duplicates of a queued event are ignored
+            if webhook_queue.enqueue(event["id"], event["type"], payload.decode("utf-8")):
+                webhook_workers.notify()
+            return {"status": "queued", "eventId": event["id"]}
         
-        return {"status": "success", "eventType": event_type}
+        return await process_stripe_event(event, background_tasks)
         
     except stripe.error.SignatureVerificationError:
         # Invalid signature - this request didn't come from Stripe
@@ -583,20 +630,148 @@ async def stripe_webhook(request: Request, background_tasks: BackgroundTasks):
         # Log the error but return 200 to Stripe
         # Stripe will retry the webhook if we return an error status
         print(f"⚠️ Error processing webhook: {str(e)}")
-        # Store the failed event
+        # Store the failed event: full payload locally, compact record in Firestore
         error_id = str(uuid.uuid4())
-        db.collection("webhookErrors").document(error_id).set({
+        archive_path = await webhook_archive.write("errors", {
             "errorId": error_id,
             "timestamp": datetime.now().isoformat(),
             "error": str(e),
             "payload": payload.decode("utf-8"),
             "signature": sig_header
         })
+        await run_db(
+            db.collection("webhookErrors").document(error_id).set,
+            compact_error_record(error_id, str(e), payload, archive_path)
+        )
         # Return 200 to acknowledge receipt
         return {"status": "error", "message": "Error processing webhook, but request received"}
 
+async def process_stripe_event(event, background_tasks):
+    """Deduplicate a verified Stripe event and dispatch it to its handler"""
+    # Extract the event type and data
+    event_type = event["type"]
+    event_data = event["data"]["object"]
+    
+    print(f"Processing Stripe webhook: {event_type}")
+    
+    # Claim the event atomically so duplicate or concurrent deliveries are skipped
+    event_id = event["id"]
+    claimed = await webhook_idempotency.claim(event_id, compact_event_record(event_id, event_type, event_data))
+    
+    if not claimed:
+        print(f"Webhook event {event_id} already processed, skipping")
+        return {"status": "success", "message": "Event already processed"}
+    
+    try:
+        await dispatch_stripe_event(event_type, event_data, background_tasks)
+    except Exception:
+        # Give the claim back so a queue retry, a replay or a Stripe resend can process it again
+        await webhook_idempotency.release(event_id)
+        raise
+    
+    await webhook_archive.write("events", event)
+    return {"status": "success", "eventType": event_type}
+
+async def dispatch_stripe_event(event_type, event_data, background_tasks):
+    """Run the handler for one event type; handler errors propagate to the caller"""
+    if event_type == "payment_intent.succeeded":
+        # Handle successful payments
+        await handle_successful_payment(event_data, background_tasks)
+    elif event_type == "payment_intent.payment_failed":
+        # Handle failed payments
+        await handle_failed_payment(event_data, background_tasks)
+        
+    elif event_type == "charge.succeeded":
+        # Handle successful charges (for one-time payments)
+        await handle_successful_payment(event_data, background_tasks)
+    elif event_type == "charge.refunded":
+        # Handle refunds
+        await handle_refund(event_data, background_tasks)
+        
+    elif event_type == "customer.subscription.created":
+        # Handle new subscriptions (for recurring investments)
+        await handle_subscription_created(event_data, background_tasks)
+        
+    elif event_type == "customer.subscription.updated":
+        # Handle subscription updates
+        await handle_subscription_updated(event_data, background_tasks)
+        
+    elif event_type == "customer.subscription.deleted":
+        # Handle subscription cancellations
+        await handle_subscription_cancelled(event_data, background_tasks)
+        
+    # Add other event types as needed
+
+async def process_queued_event(payload: str):
+    """Worker entry point: rebuild a queued (already verified) event and process it"""
+    event = json.loads(payload)
+    background_tasks = BackgroundTasks()
+    await process_stripe_event(event, background_tasks)
+    # No response to attach them to, so run follow-up tasks right here
+    await background_tasks()
+
 # --- Webhook Handler Functions ---
 
+async def commit_with_financial_info(writes, user_id: str, financial_info: dict) -> bool:
+    """Commit `writes(batch)` and a financialInfo update on the user doc in one round trip
+
+    Use firestore.Increment for counters so concurrent events never lose updates.
+    Returns False when the user doc doesn't exist; the other writes are still committed.
+    """
+    user_ref = db.collection("users").document(user_id)
+    batch = db.batch()
+    writes(batch)
+    batch.update(user_ref, financial_info)
+    try:
+        await run_db(batch.commit)
+    except NotFound:
+        batch = db.batch()
+        writes(batch)
+        await run_db(batch.commit)
+        return False
+    financial_info_writer.forget(user_id)
+    return True
+
+def complete_deposit(deposit_ref, user_id: str, amount: float, backfill: Optional[dict] = None) -> bool:
+    """Mark a deposit completed and credit financialInfo, once per deposit
+
+    payment_intent.succeeded and charge.succeeded both report the same deposit,
+    so the status is read and written in one transaction and an already
+    completed deposit is left alone. A missing deposit is written from
+    `backfill` when given. Returns True when this call completed it.
+    """
+    user_ref = db.collection("users").document(user_id)
+
+    @firestore.transactional
+    def complete(transaction):
+        deposit_doc = deposit_ref.get(transaction=transaction)
+        user_doc = user_ref.get(transaction=transaction)
+        completed = {
+            "status": "completed",
+            "completedAt": datetime.now().isoformat(),
+        }
+        if deposit_doc.exists:
+            if deposit_doc.get("status") == "completed":
+                return False
+            transaction.update(deposit_ref, completed)
+        elif backfill is not None:
+            transaction.set(deposit_ref, {**backfill, **completed}, merge=True)
+        else:
+            return False
+        
+        # Update both totalInvested and portfolioValue in the same commit
+        if user_doc.exists:
+            transaction.update(user_ref, {
+                "financialInfo.totalInvested": firestore.Increment(amount),
+                "financialInfo.portfolioValue": firestore.Increment(amount),
+                "financialInfo.accountConnected": True,
+                "financialInfo.lastDepositDate": datetime.now().isoformat()
+            })
+            print(f"✅ User financial info updated for deposit: {deposit_ref.id}")
+        return True
+
+    return complete(db.transaction())
+
 async def handle_successful_payment(payment_intent, background_tasks):
     """Handle successful payment events"""
     try:
@@ -613,40 +788,47 @@ async def handle_successful_payment(payment_intent, background_tasks):
         
         # Handle deposit specifically
         if payment_purpose == "account_deposit":
-            # Update deposit status
-            deposits_ref = db.collection("deposits").where("paymentIntentId", "==", payment_id).limit(1)
-            deposits = list(deposits_ref.stream())
+            # Deposits are keyed by their payment intent ID; charge.succeeded carries it as payment_intent
+            intent_id = payment_intent.get("payment_intent") or payment_id
+            deposit_ref = db.collection("deposits").document(intent_id)
+            deposit_doc = await run_db(deposit_ref.get)
             
-            if deposits:
-                deposit_doc = deposits[0]
-                deposit_ref = db.collection("deposits").document(deposit_doc.id)
-                
-                # Mark deposit as completed
-                deposit_ref.update({
-                    "status": "completed",
-                    "completedAt": datetime.now().isoformat(),
-                })
-                
-                # Update user's financial info for the deposit
-                user_ref = db.collection("users").document(user_id)
-                user_doc = user_ref.get()
-                
-                if user_doc.exists:
-                    user_data = user_doc.to_dict()
-                    current_invested = user_data.get("financialInfo", {}).get("totalInvested", 0)
-                    current_portfolio = user_data.get("financialInfo", {}).get("portfolioValue", 0)
-                    
-                    # Update both totalInvested and portfolioValue
-                    user_ref.update({
-                        "financialInfo.totalInvested": current_invested + amount,
-                        "financialInfo.portfolioValue": current_portfolio + amount,
-                        "financialInfo.accountConnected": True,
-                        "financialInfo.lastDepositDate": datetime.now().isoformat()
-                    })
-                    
-                    print(f"✅ User financial info updated for deposit: {payment_id}")
-            else:
-                print(f"⚠️ No deposit found for paymentIntentId: {payment_id}")
+            if not deposit_doc.exists and deposit_writer.has_pending():
+                # The deposit record may still be buffered by /api/deposit
+                await deposit_writer.flush()
+                deposit_doc = await run_db(deposit_ref.get)
+            
+            if not deposit_doc.exists:
+                # Deposits created before the ID migration (scripts/migrate_deposit_ids.py)
+                legacy = await stream_all(
+                    db.collection("deposits").where("paymentIntentId", "==", intent_id).limit(1)
+                )
+                if legacy:
+                    deposit_doc = legacy[0]
+                    deposit_ref = deposit_doc.reference
+            
+            backfill = None
+            if not deposit_doc.exists:
+                if payment_intent.get("object") != "payment_intent":
+                    # The intent's own payment_intent.succeeded records and credits it
+                    print(f"⚠️ No deposit found for paymentIntentId: {intent_id}")
+                    return
+                # The pending record never reached Firestore (e.g. lost with a crashed instance's
+                # journal); rebuild it from the payment so the money is still credited
+                print(f"⚠️ No deposit found for paymentIntentId: {intent_id}, recording it from the payment")
+                backfill = {
+                    "depositId": intent_id,
+                    "userId": user_id,
+                    "amount": amount,
+                    "currency": payment_intent.get("currency"),
+                    "paymentIntentId": intent_id,
+                    "description": payment_intent.get("description", "Account deposit"),
+                }
+            
+            if not await run_db(complete_deposit, deposit_ref, user_id, amount, backfill):
+                print(f"Deposit {intent_id} already completed, skipping")
+                return
+            financial_info_writer.forget(user_id)
             
             # Record transaction
             background_tasks.add_task(
@@ -656,7 +838,7 @@ async def handle_successful_payment(payment_intent, background_tasks):
                 amount, 
                 "completed",
                 {
-                    "paymentIntentId": payment_id,
+                    "paymentIntentId": intent_id,
                     "paymentMethod": payment_method,
                     "description": payment_intent.get("description", "Account deposit")
                 }
@@ -667,36 +849,43 @@ async def handle_successful_payment(payment_intent, background_tasks):
             investment_id = payment_intent["metadata"].get("investmentId")
             # Rest of your existing investment handling code...
             inv_ref = db.collection("investments").document(investment_id)
-            inv_doc = inv_ref.get()
+            inv_doc = await run_db(inv_ref.get)
             
             if inv_doc.exists:
-                # Mark investment as active
-                inv_ref.update({
-                    "status": "active",
-                    "paymentId": payment_id,
-                    "paymentTimestamp": datetime.now().isoformat(),
-                    "paymentDetails": {
-                        "amount": amount,
-                        "currency": payment_intent["currency"],
-                        "paymentMethod": payment_method,
-                        "paymentIntentId": payment_id
-                    }
-                })
+                inv_data = inv_doc.to_dict()
+                await run_db(ensure_aggregate, db, user_id, DAILY_INTEREST_RATE)
                 
-                # Update user's financial info
-                user_ref = db.collection("users").document(user_id)
-                user_doc = user_ref.get()
+                # A retried payment revives an investment that was dropped from the aggregate,
+                # and a scheduled recurring child joins it only once paid
+                joins_aggregate = inv_data.get("status") == "failed" or inv_data.get("inAggregate") is False
+
+                def investment_writes(batch):
+                    if joins_aggregate:
+                        apply_position(db, user_id, inv_data.get("amount", 0), inv_data.get("timestamp"),
+                                       DAILY_INTEREST_RATE, batch=batch)
+                    # Mark investment as active
+                    update = {
+                        "status": "active",
+                        "paymentId": payment_id,
+                        "paymentTimestamp": datetime.now().isoformat(),
+                        "paymentDetails": {
+                            "amount": amount,
+                            "currency": payment_intent["currency"],
+                            "paymentMethod": payment_method,
+                            "paymentIntentId": payment_id
+                        }
+                    }
+                    if joins_aggregate:
+                        update["inAggregate"] = True
+                    batch.update(inv_ref, update)
                 
-                if user_doc.exists:
-                    user_data = user_doc.to_dict()
-                    current_invested = user_data.get("financialInfo", {}).get("totalInvested", 0)
-                    current_portfolio = user_data.get("financialInfo", {}).get("portfolioValue", 0)
-                    
-                    user_ref.update({
-                        "financialInfo.totalInvested": current_invested + amount,
-                        "financialInfo.portfolioValue": current_portfolio + amount,
-                        "financialInfo.lastInvestmentDate": datetime.now().isoformat()
-                    })
+                # Update user's financial info in the same commit
+                await commit_with_financial_info(investment_writes, user_id, {
+                    "financialInfo.totalInvested": firestore.Increment(amount),
+                    "financialInfo.portfolioValue": firestore.Increment(amount),
+                    "financialInfo.lastInvestmentDate": datetime.now().isoformat()
+                })
+                history_cache.invalidate(user_id)
             
                 # Record transaction (existing code)
                 background_tasks.add_task(
@@ -734,7 +923,8 @@ async def handle_successful_payment(payment_intent, background_tasks):
         
     except Exception as e:
         print(f"⚠️ Error processing successful payment: {str(e)}")
-        # Log error but don't re-raise - we want to acknowledge receipt to Stripe
+        # process_stripe_event releases the event claim so the event can be retried
+        raise
 
 async def handle_failed_payment(payment_intent, background_tasks):
     """Handle failed payment events"""
@@ -756,13 +946,24 @@ async def handle_failed_payment(payment_intent, background_tasks):
         # Check if this payment is associated with an investment
         investment_id = payment_intent["metadata"].get("investmentId")
         if investment_id:
+            inv_ref = db.collection("investments").document(investment_id)
+            inv_doc = await run_db(inv_ref.get)
+            await run_db(ensure_aggregate, db, user_id, DAILY_INTEREST_RATE)
+            batch = db.batch()
+            if inv_doc.exists:
+                # Drop whatever principal this investment still contributes
+                inv_data = inv_doc.to_dict()
+                apply_position(db, user_id, -effective_amount(inv_data), inv_data.get("timestamp"),
+                               DAILY_INTEREST_RATE, batch=batch)
             # Update investment status
-            db.collection("investments").document(investment_id).update({
+            batch.update(inv_ref, {
                 "status": "failed",
                 "failureReason": error_message,
                 "failureCode": error_code,
                 "lastAttempt": datetime.now().isoformat()
             })
+            await run_db(batch.commit)
+            history_cache.invalidate(user_id)
         
         # Record transaction
         background_tasks.add_task(
@@ -783,6 +984,45 @@ async def handle_failed_payment(payment_intent, background_tasks):
         
     except Exception as e:
         print(f"⚠️ Error processing failed payment: {str(e)}")
+        raise
+
+def record_refund(investment_id: str, user_id: str, refunded_total: float) -> Optional[float]:
+    """Apply a charge's cumulative refund to its investment, the aggregate and financialInfo
+
+    Stripe's amount_refunded is cumulative and events may arrive in any order,
+    so only a total above the stored refundAmount is applied, read and written
+    in one transaction. Returns the principal newly removed, or None when the
+    event is stale (or the investment doesn't exist).
+    """
+    inv_ref = db.collection("investments").document(investment_id)
+    user_ref = db.collection("users").document(user_id)
+
+    @firestore.transactional
+    def refund(transaction):
+        inv_doc = inv_ref.get(transaction=transaction)
+        user_doc = user_ref.get(transaction=transaction)
+        if not inv_doc.exists:
+            print(f"⚠️ No investment {investment_id} for refund")
+            return None
+        inv_data = inv_doc.to_dict()
+        if refunded_total <= (inv_data.get("refundAmount") or 0):
+            return None
+        
+        refunded = {**inv_data, "status": "refunded", "refundAmount": refunded_total}
+        newly_refunded = effective_amount(inv_data) - effective_amount(refunded)
+        apply_position(db, user_id, -newly_refunded, inv_data.get("timestamp"),
+                       DAILY_INTEREST_RATE, batch=transaction)
+        # Mark investment as refunded
+        transaction.update(inv_ref, {
+            "status": "refunded",
+            "refundedAt": datetime.now().isoformat(),
+            "refundAmount": refunded_total
+        })
+        if user_doc.exists:
+            transaction.update(user_ref, {"financialInfo.totalInvested": firestore.Increment(-newly_refunded)})
+        return newly_refunded
+
+    return refund(db.transaction())
 
 async def handle_refund(charge, background_tasks):
     """Handle refund events"""
@@ -793,9 +1033,9 @@ async def handle_refund(charge, background_tasks):
             print("⚠️ No payment_intent in charge data")
             return
             
-        # Retrieve the payment intent to get metadata
-        payment_intent = stripe.PaymentIntent.retrieve(payment_intent_id)
-        user_id = payment_intent.metadata.get("userId")
+        # Charges carry their payment intent's metadata; only retrieve it when missing
+        metadata = metadata_with(charge, "userId") or await stripe_lookup.payment_intent_metadata(payment_intent_id)
+        user_id = metadata.get("userId")
         
         if not user_id:
             print("⚠️ No userId in payment metadata")
@@ -804,27 +1044,15 @@ async def handle_refund(charge, background_tasks):
         amount = charge["amount_refunded"] / 100  # Refunded amount in dollars
         
         # Check if this payment is associated with an investment
-        investment_id = payment_intent.metadata.get("investmentId")
+        investment_id = metadata.get("investmentId")
         if investment_id:
-            # Mark investment as refunded
-            db.collection("investments").document(investment_id).update({
-                "status": "refunded",
-                "refundedAt": datetime.now().isoformat(),
-                "refundAmount": amount
-            })
-            
-            # Update user's financial info
-            user_ref = db.collection("users").document(user_id)
-            user_doc = user_ref.get()
-            
-            if user_doc.exists:
-                user_data = user_doc.to_dict()
-                current_invested = user_data.get("financialInfo", {}).get("totalInvested", 0)
-                
-                # Reduce total invested amount
-                user_ref.update({
-                    "financialInfo.totalInvested": max(0, current_invested - amount)
-                })
+            await run_db(ensure_aggregate, db, user_id, DAILY_INTEREST_RATE)
+            newly_refunded = await run_db(record_refund, investment_id, user_id, amount)
+            if newly_refunded is None:
+                print(f"Nothing newly refunded for {investment_id} (stale or out-of-order event), skipping")
+                return
+            financial_info_writer.forget(user_id)
+            history_cache.invalidate(user_id)
         
         # Record transaction
         background_tasks.add_task(
@@ -845,6 +1073,7 @@ async def handle_refund(charge, background_tasks):
         
     except Exception as e:
         print(f"⚠️ Error processing refund: {str(e)}")
+        raise
 
 async def handle_subscription_created(subscription, background_tasks):
     """Handle subscription created events (for recurring investments)"""
@@ -855,9 +1084,9 @@ async def handle_subscription_created(subscription, background_tasks):
             print("⚠️ No customer in subscription data")
             return
             
-        # Retrieve customer to get user ID from metadata
-        customer = stripe.Customer.retrieve(customer_id)
-        user_id = customer.metadata.get("userId")
+        # Use the subscription's own metadata when present, else the (cached) customer's
+        metadata = metadata_with(subscription, "userId") or await stripe_lookup.customer_metadata(customer_id)
+        user_id = metadata.get("userId")
         
         if not user_id:
             print("⚠️ No userId in customer metadata")
@@ -882,7 +1111,12 @@ async def handle_subscription_created(subscription, background_tasks):
             "nextPaymentDate": datetime.fromtimestamp(subscription["current_period_end"]).isoformat()
         }
         
-        db.collection("investments").document(investment_id).set(investment_data)
+        await run_db(ensure_aggregate, db, user_id, DAILY_INTEREST_RATE)
+        batch = db.batch()
+        batch.set(db.collection("investments").document(investment_id), investment_data)
+        apply_position(db, user_id, amount, investment_data["timestamp"], DAILY_INTEREST_RATE, batch=batch)
+        await run_db(batch.commit)
+        history_cache.invalidate(user_id)
         
         # Record transaction
         background_tasks.add_task(
@@ -903,6 +1137,7 @@ async def handle_subscription_created(subscription, background_tasks):
         
     except Exception as e:
         print(f"⚠️ Error processing subscription creation: {str(e)}")
+        raise
 
 async def handle_subscription_updated(subscription, background_tasks):
     """Handle subscription updated events"""
@@ -914,7 +1149,7 @@ async def handle_subscription_cancelled(subscription, background_tasks):
     # Implementation similar to subscription created, but update status to cancelled
     pass
 
-@app.post("api/withdrawals")
+@app.post("/api/withdrawals")
 async def request_withdrawal(
     withdrawal: WithdrawalRequest, 
     background_tasks: BackgroundTasks,
@@ -922,25 +1157,12 @@ async def request_withdrawal(
 ):
     """Request a withdrawal from investment account"""
     try:
-        # Get user's portfolio value
-        portfolio = get_portfolio_value(user["uid"])
-        
-        # Check if user has enough funds
-        if withdrawal.amount > portfolio["current_value"]:
-            raise HTTPException(status_code=400, detail="Insufficient funds for withdrawal")
-        
-        # Create withdrawal record
-        withdrawal_id = str(uuid.uuid4())
-        withdrawal_data = {
-            "withdrawalId": withdrawal_id,
-            "userId": user["uid"],
-            "amount": withdrawal.amount,
-            "accountId": withdrawal.account_id,
-            "status": "pending",
-            "requestedAt": datetime.now().isoformat()
-        }
-        
-        db.collection("withdrawals").document(withdrawal_id).set(withdrawal_data)
+        # Check the available balance and hold the amount in one transaction
+        withdrawal_data, available = await run_db(
+            withdrawals.request_withdrawal, db, user["uid"], withdrawal.amount, withdrawal.account_id,
+            DAILY_INTEREST_RATE, ANNUAL_INTEREST_RATE
+        )
+        withdrawal_id = withdrawal_data["withdrawalId"]
         
         # Record transaction
         background_tasks.add_task(
@@ -956,64 +1178,122 @@ async def request_withdrawal(
             "message": "Withdrawal request submitted successfully",
             "withdrawalId": withdrawal_id,
             "status": "pending",
+            "availableBalance": available,
             "estimatedProcessingTime": "3-5 business days"
         }
-    except HTTPException:
-        raise
+    except withdrawals.InsufficientFunds:
+        raise HTTPException(status_code=400, detail="Insufficient funds for withdrawal")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing withdrawal: {str(e)}")
 
-@app.get("/api/transactions")
-async def get_transactions(user=Depends(get_current_user)):
-    """Get transaction history for current user"""
+@app.post("/api/withdrawals/{withdrawal_id}/cancel")
+async def cancel_withdrawal(
+    withdrawal_id: str,
+    background_tasks: BackgroundTasks,
+    user=Depends(get_current_user)
+):
+    """Cancel a pending withdrawal and release its held funds"""
     try:
-        transactions_ref = db.collection("transactions").where("userId", "==", user["uid"]).stream()
+        withdrawal_data = await run_db(
+            withdrawals.cancel_withdrawal, db, withdrawal_id, DAILY_INTEREST_RATE, user["uid"]
+        )
         
-        transactions = []
-        for tx in transactions_ref:
-            transactions.append(tx.to_dict())
-            
-        # Sort by timestamp (newest first)
-        transactions.sort(key=lambda x: x.get("timestamp", ""), reverse=True)
+        background_tasks.add_task(
+            save_transaction, 
+            user["uid"], 
+            "withdrawal", 
+            withdrawal_data["amount"], 
+            "cancelled",
+            {"withdrawalId": withdrawal_id}
+        )
         
-        return {"transactions": transactions}
+        return {"message": "Withdrawal cancelled", "withdrawalId": withdrawal_id, "status": "cancelled"}
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except withdrawals.WithdrawalStateError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error cancelling withdrawal: {str(e)}")
+
+@app.get("/api/transactions")
+async def get_transactions(
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    user=Depends(get_current_user)
+):
+    """Get transaction history for current user, newest first, one page at a time"""
+    try:
+        query = db.collection("transactions").where("userId", "==", user["uid"])
+        docs, next_cursor = await run_db(fetch_page, query, limit, cursor)
+        
+        return {"transactions": [tx.to_dict() for tx in docs], "nextCursor": next_cursor}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching transactions: {str(e)}")
 
+def export_response(query, fmt: str, columns: List[str], name: str) -> StreamingResponse:
+    """Stream a Firestore query as NDJSON or CSV without materializing it"""
+    if fmt not in MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(MEDIA_TYPES)}")
+    filename = f"{name}-{datetime.now().strftime('%Y%m%d')}.{fmt}"
+    return StreamingResponse(
+        export_rows(firestore_pages(query), make_encoder(fmt, columns)),
+        media_type=MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@app.get("/api/transactions/export")
+async def export_transactions(format: str = "ndjson", user=Depends(get_current_user)):
+    """Export the full transaction history for current user as NDJSON or CSV"""
+    query = db.collection("transactions").where("userId", "==", user["uid"])
+    return export_response(query, format, TRANSACTION_COLUMNS, "transactions")
+
+@app.get("/api/investments/export")
+async def export_investments(format: str = "ndjson", user=Depends(get_current_user)):
+    """Export all investments for current user as NDJSON or CSV"""
+    query = db.collection("investments").where("userId", "==", user["uid"])
+    return export_response(query, format, INVESTMENT_COLUMNS, "investments")
+
 @app.post("/api/deposit")
 async def deposit(request: Request, authorization: str = Header(None)):
+    timer = StageTimer("deposit")
+
     # 🔐 Token check
     if not authorization or not authorization.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Missing or invalid token")
 
     token = authorization.split("Bearer ")[1]
-    decoded = verify_token(token)
+    # Token verification and body parsing don't depend on each other
+    decoded, body = await asyncio.gather(
+        timer.measure("auth", asyncio.to_thread(verify_token, token)),
+        timer.measure("parse", request.json()),
+    )
     if not decoded:
         raise HTTPException(status_code=403, detail="Invalid or expired token")
 
     user_id = decoded["uid"]
 
     # Parse request body
-    body = await request.json()
     amount = body.get("amount")
     currency = body.get("currency", "inr")  # Default to INR for Indian Rupees
     description = body.get("description", "Account deposit")
 
     # Validate minimum amount (₹100 in paise = 10000)
     if not amount or amount < 10000:
-        return JSONResponse(status_code=400, content={"error": "Minimum deposit amount is ₹100"})
+        return timer.finish(JSONResponse(status_code=400, content={"error": "Minimum deposit amount is ₹100"}))
 
     try:
         # Check if Stripe API key is set properly
         if not stripe.api_key or stripe.api_key == "sk_test_your_test_key":
             print("⚠️ WARNING: Using default/placeholder Stripe API key. Set STRIPE_API_KEY environment variable.")
-            return JSONResponse(
+            return timer.finish(JSONResponse(
                 status_code=500, 
                 content={"error": "Stripe not properly configured. Please contact support."}
-            )
+            ))
             
         # Create payment intent
-        intent = stripe.PaymentIntent.create(
+        intent = await timer.measure("stripe", stripe_async.create_payment_intent(
             amount=amount,
             currency=currency,
             description=description,
@@ -1024,49 +1304,50 @@ async def deposit(request: Request, authorization: str = Header(None)):
             automatic_payment_methods={
                 "enabled": True
             }
-        )
+        ))
         
-        # Record the pending deposit in Firestore
-        deposit_id = str(uuid.uuid4())
-        deposit_data = {
-            "depositId": deposit_id,
-            "userId": user_id,
-            "amount": amount / 100,  # Convert back to rupees for storage
-            "currency": currency,
-            "status": "pending",
-            "createdAt": datetime.now().isoformat(),
-            "paymentIntentId": intent.id,
-            "description": description
-        }
-        
-        db.collection("deposits").document(deposit_id).set(deposit_data)
+        # Record the pending deposit, keyed by payment intent for webhook lookups.
+        # The write is journaled locally and committed in the background.
+        with timer.stage("persist"):
+            deposit_id = intent.id
+            deposit_data = {
+                "depositId": deposit_id,
+                "userId": user_id,
+                "amount": amount / 100,  # Convert back to rupees for storage
+                "currency": currency,
+                "status": "pending",
+                "createdAt": datetime.now().isoformat(),
+                "paymentIntentId": intent.id,
+                "description": description
+            }
+            deposit_writer.add(db.collection("deposits").document(deposit_id), deposit_data)
         
-        return {
+        return timer.finish(JSONResponse(content={
             "clientSecret": intent.client_secret,
             "paymentIntentId": intent.id
-        }
+        }))
 
     except stripe.error.AuthenticationError as e:
         # Handle invalid API key errors specifically
         print(f"⚠️ Stripe authentication error: {str(e)}")
-        return JSONResponse(
+        return timer.finish(JSONResponse(
             status_code=500, 
             content={"error": "Invalid Stripe API key. Please contact support."}
-        )
+        ))
     except stripe.error.StripeError as e:
         # Handle other Stripe-specific errors
         print(f"⚠️ Stripe error: {str(e)}")
-        return JSONResponse(
+        return timer.finish(JSONResponse(
             status_code=400, 
             content={"error": f"Payment service error: {str(e)}"}
-        )
+        ))
     except Exception as e:
         # Handle generic errors
         print(f"⚠️ Error creating payment intent: {str(e)}")
-        return JSONResponse(
+        return timer.finish(JSONResponse(
             status_code=500, 
             content={"error": f"An unexpected error occurred: {str(e)}"}
-        )
+        ))
 
 
 @app.get("/api/transactions/user/{user_id}")
@@ -1078,7 +1359,7 @@ async def get_user_transactions(user_id: str):
     - user_id: Firebase user ID
     """
     try:
-        return TransactionService.get_transactions(user_id)
+        return await run_db(TransactionService.get_transactions, user_id)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
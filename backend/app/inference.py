@@ -0,0 +1,379 @@
+import asyncio
+import multiprocessing
+import os
+import pickle
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import joblib
+import numpy as np
+
+from .metrics import LATENCY_BUCKETS, registry
+from .tree_ensemble import CompiledEnsemble, compile_model
+
+# Column order the models were trained with (see services/models/withdraw_feature_names.json)
+WITHDRAWAL_FEATURES = [
+    "net_monthly_income",
+    "monthly_fixed_expenses",
+    "income_to_spend_ratio",
+    "transaction_amount",
+    "days_since_last_salary",
+    "avg_monthly_spend",
+    "last_7_days_spend",
+    "current_balance",
+    "days_since_last_withdrawal",
+    "recent_large_expense",
+]
+
+SAVINGS_FEATURES = [
+    "net_monthly_income",
+    "monthly_fixed_expenses",
+    "income_to_spend_ratio",
+    "transaction_amount",
+    "round_off_diff",
+    "balance_after_transaction",
+    "days_since_last_salary",
+    "avg_monthly_spend",
+    "last_7_days_spend",
+    "current_balance",
+    "has_upcoming_bill",
+    "days_since_last_withdrawal",
+    "recent_large_expense",
+]
+
+MAX_BATCH_ROWS = 10000
+
+# Micro-batching of single-row predictions (see MicroBatcher)
+INFERENCE_BATCH_WINDOW_MS = float(os.getenv("INFERENCE_BATCH_WINDOW_MS", "2"))
+INFERENCE_MAX_BATCH = int(os.getenv("INFERENCE_MAX_BATCH", "64"))
+BATCH_SIZE_BUCKETS = [1, 2, 4, 8, 16, 32, 64, 128, 256, 512]
+
+# Where predict runs: "thread" or "process" pool, or "inline" on the event loop
+INFERENCE_EXECUTOR = os.getenv("INFERENCE_EXECUTOR", "thread")
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "2"))
+# Threads each predict call may use; workers x threads should not exceed the cores
+INFERENCE_MODEL_THREADS = int(os.getenv("INFERENCE_MODEL_THREADS", "1"))
+# Predict with the array-backed evaluator in tree_ensemble.py when it matches the model
+INFERENCE_COMPILED_TREES = os.getenv("INFERENCE_COMPILED_TREES", "true").lower() == "true"
+# Larger batches go to the library's own predict, which wins once there are enough rows
+INFERENCE_COMPILED_MAX_ROWS = int(os.getenv("INFERENCE_COMPILED_MAX_ROWS", "64"))
+
+# Load models in the background at start-up, or only when first used
+INFERENCE_LAZY_MODELS = os.getenv("INFERENCE_LAZY_MODELS", "false").lower() == "true"
+
+MODELS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "services", "models")
+MODEL_FILES = {
+    "withdrawal": "xgb_withdrawal_model.joblib",       # XGBoost
+    "savings_salaried": "rf_model_salaried.pkl",       # RandomForest
+    "savings_self_employed": "rf_model_self_employed.pkl",
+    "savings_student": "rf_model_student.pkl",
+}
+MODEL_FEATURES = {
+    "withdrawal": WITHDRAWAL_FEATURES,
+    "savings_salaried": SAVINGS_FEATURES,
+    "savings_self_employed": SAVINGS_FEATURES,
+    "savings_student": SAVINGS_FEATURES,
+}
+
+
+def feature_row(features: Dict[str, Any], names: List[str]) -> List[float]:
+    """One row in model column order; raises KeyError for a missing feature"""
+    return [float(features[name]) for name in names]
+
+
+def feature_matrix(rows: List[Any], names: List[str]) -> Tuple[np.ndarray, List[int], Dict[int, str]]:
+    """Stack valid rows into one 2D array
+
+    Returns the array, the input index of each array row, and an error message
+    for every input row that was left out.
+    """
+    values: List[List[float]] = []
+    indices: List[int] = []
+    errors: Dict[int, str] = {}
+    for i, features in enumerate(rows):
+        if not isinstance(features, dict):
+            errors[i] = "Row must be an object of features"
+            continue
+        missing = [name for name in names if name not in features]
+        if missing:
+            errors[i] = f"Missing feature: {', '.join(missing)}"
+            continue
+        try:
+            values.append(feature_row(features, names))
+        except (TypeError, ValueError):
+            errors[i] = "Features must be numeric"
+            continue
+        indices.append(i)
+    matrix = np.asarray(values, dtype=np.float64).reshape(len(values), len(names))
+    return matrix, indices, errors
+
+
+def batch_results(n_rows: int, indices: List[int], predictions: Optional[np.ndarray],
+                  errors: Dict[int, str], key: str) -> List[Dict[str, Any]]:
+    """Per-row results in input order: {key: decision} or {"error": message}"""
+    results: List[Dict[str, Any]] = [{"index": i} for i in range(n_rows)]
+    if predictions is not None:
+        for i, decision in zip(indices, predictions):
+            results[i][key] = int(decision)
+    for i, message in errors.items():
+        results[i]["error"] = message
+    return results
+
+
+def pin_threads(model: Any, threads: int) -> Any:
+    """Cap the threads a model uses per predict call so pool workers don't oversubscribe the CPU"""
+    if hasattr(model, "get_booster"):
+        # Set directly: set_params() fails on models pickled by older XGBoost versions
+        model.n_jobs = threads
+        model.get_booster().set_param({"nthread": threads})
+    elif hasattr(model, "n_jobs"):
+        model.n_jobs = threads
+    return model
+
+
+class CompiledPredictor:
+    """Predicts small batches with the compiled evaluator and large ones with the model itself"""
+
+    def __init__(self, model: Any, compiled: CompiledEnsemble, max_rows: int = INFERENCE_COMPILED_MAX_ROWS):
+        self.model = model
+        self.compiled = compiled
+        self.max_rows = max_rows
+
+    def predict(self, rows: np.ndarray) -> np.ndarray:
+        if len(rows) <= self.max_rows:
+            return self.compiled.predict(rows)
+        return self.model.predict(rows)
+
+
+def load_model(name: str, threads: int = INFERENCE_MODEL_THREADS, compiled: bool = INFERENCE_COMPILED_TREES) -> Any:
+    """Load a model; with `compiled`, its flattened evaluator if that passes the parity check"""
+    path = os.path.join(MODELS_DIR, MODEL_FILES[name])
+    if path.endswith(".joblib"):
+        model = joblib.load(path)
+    else:
+        with open(path, "rb") as f:
+            model = pickle.load(f)
+    model = pin_threads(model, threads)
+    flattened = compile_model(model) if compiled else None
+    return CompiledPredictor(model, flattened) if flattened is not None else model
+
+
+def warm_up(name: str, model: Any) -> Any:
+    """One prediction on a zero row, so the first request doesn't pay for lazy initialization"""
+    model.predict(np.zeros((1, len(MODEL_FEATURES[name])), dtype=np.float64))
+    return model
+
+
+class ModelLoader:
+    """Loads the models into `models` concurrently, eagerly or on first use
+
+    Each model is loaded and warmed up on a thread; a model that fails to load
+    is reported in `status()` instead of failing start-up, and is not retried.
+    """
+
+    def __init__(self, models: Dict[str, Any], lazy: bool = INFERENCE_LAZY_MODELS):
+        self.models = models
+        self.lazy = lazy
+        self.errors: Dict[str, str] = {}
+        self._loading: Dict[str, asyncio.Task] = {}
+
+    def _load(self, name: str) -> Any:
+        start = time.perf_counter()
+        model = warm_up(name, load_model(name))
+        print(f"✅ Loaded model {name} in {time.perf_counter() - start:.2f}s")
+        return model
+
+    async def _load_into(self, name: str):
+        try:
+            self.models[name] = await asyncio.to_thread(self._load, name)
+        except Exception as e:
+            self.errors[name] = str(e)
+            print(f"❌ Could not load model {name}: {str(e)}")
+
+    async def ensure(self, name: str) -> bool:
+        """Whether `name` is usable, loading it first if needed"""
+        if self.models.get(name) is not None:
+            return True
+        if name in self.errors:
+            return False
+        await asyncio.shield(self._task(name))
+        return self.models.get(name) is not None
+
+    def _task(self, name: str) -> asyncio.Task:
+        if name not in self._loading:
+            self._loading[name] = asyncio.get_running_loop().create_task(self._load_into(name))
+        return self._loading[name]
+
+    def start(self):
+        """Begin loading every model in the background"""
+        for name in MODEL_FILES:
+            self._task(name)
+
+    def status(self) -> Dict[str, str]:
+        status = {}
+        for name in MODEL_FILES:
+            if self.models.get(name) is not None:
+                status[name] = "ready"
+            elif name in self.errors:
+                status[name] = "failed"
+            elif name in self._loading:
+                status[name] = "loading"
+            else:
+                status[name] = "not_loaded"
+        return status
+
+    def ready(self) -> bool:
+        """Eager loading is ready once every model has loaded or failed; lazy loading is always ready"""
+        return self.lazy or all(state in ("ready", "failed") for state in self.status().values())
+
+
+# Models loaded by each process-pool worker, at start-up or on first use
+_worker_models: Dict[str, Any] = {}
+_worker_threads = INFERENCE_MODEL_THREADS
+
+
+def _init_worker(names: List[str], threads: int):
+    global _worker_threads
+    _worker_threads = threads
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    try:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(threads)
+    except ImportError:
+        pass
+    for name in names:
+        try:
+            _worker_models[name] = load_model(name, threads)
+        except Exception as e:
+            print(f"❌ Inference worker {os.getpid()} could not load {name}: {str(e)}")
+
+
+def _worker_ready() -> List[str]:
+    return sorted(_worker_models)
+
+
+def _worker_predict(name: str, rows: np.ndarray) -> np.ndarray:
+    if name not in _worker_models:
+        _worker_models[name] = load_model(name, _worker_threads)
+    return _worker_models[name].predict(rows)
+
+
+class InferencePool:
+    """Runs model.predict off the event loop
+
+    "thread" workers share the process's loaded models (XGBoost and sklearn
+    release the GIL while predicting); "process" workers each load their own
+    copy at start-up, or on first use with INFERENCE_LAZY_MODELS. "inline" keeps
+    the old behaviour of predicting on the event loop.
+    """
+
+    def __init__(self, models: Dict[str, Any], kind: str = INFERENCE_EXECUTOR,
+                 workers: int = INFERENCE_WORKERS, threads: int = INFERENCE_MODEL_THREADS):
+        if kind not in ("thread", "process", "inline"):
+            raise ValueError(f"Unknown INFERENCE_EXECUTOR: {kind}")
+        self.models = models
+        self.kind = kind
+        self.workers = workers
+        self.threads = threads
+        self._executor: Optional[Executor] = None
+        # Set once start() returns, i.e. after process workers have loaded their models
+        self.started = False
+
+    def start(self, names: List[str]):
+        """Create the pool; process workers load `names` and are warmed up before this returns"""
+        if self.kind == "thread":
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="inference")
+        elif self.kind == "process":
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(names, self.threads),
+            )
+            loaded = [f.result() for f in [self._executor.submit(_worker_ready) for _ in range(self.workers)]]
+            print(f"✅ {self.workers} inference workers started with models: {loaded[0]}")
+        self.started = True
+
+    def _predict_local(self, name: str, rows: np.ndarray) -> np.ndarray:
+        return self.models[name].predict(rows)
+
+    async def predict(self, name: str, rows: np.ndarray) -> np.ndarray:
+        if self._executor is None:
+            return self._predict_local(name, rows)
+        fn = _worker_predict if self.kind == "process" else self._predict_local
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, name, rows)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+        self.started = False
+
+
+class MicroBatcher:
+    """Coalesces concurrent single-row predictions into one batched predict call
+
+    The first row to arrive opens a window of `window` seconds; the batch is
+    run when the window closes or `max_batch` rows are waiting, whichever comes
+    first. Each caller awaits its own row's prediction.
+    """
+
+    def __init__(self, name: str, predict: Callable[[np.ndarray], Awaitable[np.ndarray]],
+                 window: float = INFERENCE_BATCH_WINDOW_MS / 1000, max_batch: int = INFERENCE_MAX_BATCH):
+        self.name = name
+        self._predict = predict
+        self._running: set = set()
+        self.window = window
+        self.max_batch = max_batch
+        self._waiting: List[Tuple[List[float], asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.batch_size = registry.histogram(
+            f"inference_{name}_batch_size", BATCH_SIZE_BUCKETS, "Rows per batched predict call")
+        self.predict_latency = registry.histogram(
+            f"inference_{name}_predict_seconds", LATENCY_BUCKETS, "Batched predict call latency")
+        self.queue_wait = registry.histogram(
+            f"inference_{name}_wait_seconds", LATENCY_BUCKETS, "Time from request to prediction")
+
+    async def predict(self, row: List[float]) -> Any:
+        """Prediction for one feature row (already in model column order)"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._waiting.append((row, future))
+        if len(self._waiting) >= self.max_batch:
+            self._dispatch()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._dispatch)
+        start = time.perf_counter()
+        try:
+            return await future
+        finally:
+            self.queue_wait.observe(time.perf_counter() - start)
+
+    def _dispatch(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._waiting:
+            batch = self._waiting[:self.max_batch]
+            del self._waiting[:self.max_batch]
+            task = asyncio.get_running_loop().create_task(self._run(batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run(self, batch: List[Tuple[List[float], asyncio.Future]]):
+        rows = np.asarray([row for row, _ in batch], dtype=np.float64)
+        start = time.perf_counter()
+        try:
+            predictions = await self._predict(rows)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        self.predict_latency.observe(time.perf_counter() - start)
+        self.batch_size.observe(len(batch))
+        for (_, future), prediction in zip(batch, predictions):
+            # A caller that went away (e.g. client disconnect) has a cancelled future
+            if not future.done():
+                future.set_result(prediction)
@@ -0,0 +1,139 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Awaitable, Callable, Dict, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class Counter:
+    def __init__(self, name: str, description: str = ""):
+        self.name = name
+        self.description = description
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+    def snapshot(self):
+        return self.value
+
+
+class Gauge:
+    """Current value, either set explicitly or read from `fn` on every snapshot"""
+
+    def __init__(self, name: str, description: str = "", fn: Optional[Callable[[], float]] = None):
+        self.name = name
+        self.description = description
+        self.value = 0
+        self._fn = fn
+
+    def set(self, value: float):
+        self.value = value
+
+    def snapshot(self):
+        return self._fn() if self._fn else self.value
+
+
+class Histogram:
+    """Cumulative bucket counts plus sum/count, Prometheus style"""
+
+    def __init__(self, name: str, buckets: List[float], description: str = ""):
+        self.name = name
+        self.description = description
+        self.buckets = sorted(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self):
+        with self._lock:
+            cumulative, running = {}, 0
+            for bound, count in zip(self.buckets + [float("inf")], self.counts):
+                running += count
+                cumulative["+Inf" if bound == float("inf") else str(bound)] = running
+            return {
+                "buckets": cumulative,
+                "sum": round(self.sum, 6),
+                "count": self.count,
+                "mean": round(self.sum / self.count, 6) if self.count else 0.0,
+            }
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+
+    def _register(self, metric):
+        # Re-registering returns the existing metric so module reloads stay harmless
+        return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, description: str = "") -> Counter:
+        return self._register(Counter(name, description))
+
+    def gauge(self, name: str, description: str = "", fn: Optional[Callable[[], float]] = None) -> Gauge:
+        return self._register(Gauge(name, description, fn))
+
+    def histogram(self, name: str, buckets: List[float], description: str = "") -> Histogram:
+        return self._register(Histogram(name, buckets, description))
+
+    def snapshot(self) -> dict:
+        return {name: metric.snapshot() for name, metric in sorted(self._metrics.items())}
+
+
+registry = Registry()
+
+LATENCY_BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0]
+
+
+class StageTimer:
+    """Per-request timing spans
+
+    Each stage is observed into the `{prefix}_{stage}_seconds` histogram and
+    kept for a Server-Timing response header. Stages may overlap when awaited
+    concurrently through `measure`.
+    """
+
+    def __init__(self, prefix: str):
+        self.prefix = prefix
+        self.spans: Dict[str, float] = {}
+        self._start = time.perf_counter()
+
+    def _record(self, stage: str, seconds: float):
+        self.spans[stage] = seconds
+        registry.histogram(f"{self.prefix}_{stage}_seconds", LATENCY_BUCKETS).observe(seconds)
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._record(name, time.perf_counter() - start)
+
+    async def measure(self, name: str, awaitable: Awaitable[T]) -> T:
+        with self.stage(name):
+            return await awaitable
+
+    def server_timing(self) -> str:
+        """Header value including a `total` span from construction until now"""
+        spans = {**self.spans, "total": time.perf_counter() - self._start}
+        return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in spans.items())
+
+    def finish(self, response=None):
+        """Record the total span and attach the Server-Timing header to `response`"""
+        header = self.server_timing()
+        self._record("total", time.perf_counter() - self._start)
+        if response is not None:
+            response.headers["Server-Timing"] = header
+        return response
@@ -0,0 +1,45 @@
+import base64
+import json
+from typing import Any, Optional, Tuple
+
+from firebase_admin import firestore
+
+DOCUMENT_ID = "__name__"
+
+
+def encode_cursor(timestamp: Any, doc_id: str) -> str:
+    """Opaque cursor pointing just past (timestamp, doc_id)"""
+    raw = json.dumps({"ts": timestamp, "id": doc_id}, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[Any, str]:
+    """Inverse of encode_cursor; raises ValueError on malformed input"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return data["ts"], data["id"]
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def newest_first(query, cursor: Optional[str] = None, field: str = "timestamp"):
+    """Order `query` by `field` desc with the doc ID as tie-breaker, resuming after `cursor`"""
+    query = query.order_by(field, direction=firestore.Query.DESCENDING) \
+                 .order_by(DOCUMENT_ID, direction=firestore.Query.DESCENDING)
+    if cursor:
+        value, doc_id = decode_cursor(cursor)
+        query = query.start_after({field: value, DOCUMENT_ID: doc_id})
+    return query
+
+
+def fetch_page(query, limit: int, cursor: Optional[str] = None,
+               field: str = "timestamp") -> Tuple[list, Optional[str]]:
+    """One page of snapshots (newest first) and the cursor for the next page, if any"""
+    docs = list(newest_first(query, cursor, field).limit(limit + 1).stream())
+    if len(docs) <= limit:
+        return docs, None
+    docs = docs[:limit]
+    last = docs[-1]
+    return docs, encode_cursor(last.get(field), last.id)
+
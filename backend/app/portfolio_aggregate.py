@@ -0,0 +1,186 @@
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from firebase_admin import firestore
+from google.api_core.exceptions import AlreadyExists
+
+from .valuation import ONE_DAY, Positions, summarize, to_naive_iso
+
+# Materialized per-user aggregate. With daily compounding the value on day t is
+#   sum_i a_i * (1+r)^(t - t_i) = (1+r)^t * sum_i a_i * (1+r)^(-t_i)
+# so keeping `discountedSum` = sum_i a_i * (1+r)^(-t_i) lets any event adjust it
+# with one atomic increment and any read value the portfolio in O(1).
+AGGREGATE_COLLECTION = "portfolioAggregates"
+BASE_DATE = np.datetime64("2024-01-01", "D")  # keeps (1+r)^(-t) close to 1
+
+# Statuses whose principal is no longer invested
+EXCLUDED_STATUSES = ("failed",)
+
+
+def day_index(when: Any) -> int:
+    """Whole days between BASE_DATE and `when` (datetime or ISO string)"""
+    iso = to_naive_iso(when) or datetime.now().isoformat()
+    return int((np.datetime64(iso, "us").astype("datetime64[D]") - BASE_DATE) // ONE_DAY)
+
+
+def effective_amount(inv_data: Dict[str, Any]) -> float:
+    """Principal an investment currently contributes to the portfolio"""
+    if inv_data.get("status") in EXCLUDED_STATUSES:
+        return 0.0
+    # Scheduled children count only once their payment succeeds (see recurring.py)
+    if inv_data.get("inAggregate") is False:
+        return 0.0
+    amount = inv_data.get("amount", 0) or 0
+    if inv_data.get("status") == "refunded":
+        amount -= inv_data.get("refundAmount", 0) or 0
+    return max(0.0, amount)
+
+
+def aggregate_ref(db, user_id: str):
+    return db.collection(AGGREGATE_COLLECTION).document(user_id)
+
+
+def position_delta(amount: float, start: Any, daily_rate: float) -> Dict[str, Any]:
+    """Field increments that add (or, with a negative amount, remove) a position"""
+    return {
+        "totalInvested": firestore.Increment(amount),
+        "discountedSum": firestore.Increment(amount * (1 + daily_rate) ** (-day_index(start))),
+        "updatedAt": datetime.now().isoformat(),
+    }
+
+
+def apply_position(db, user_id: str, amount: float, start: Any, daily_rate: float, batch=None):
+    """Atomically adjust a user's aggregate; pass `batch` to commit alongside other writes
+
+    Call ensure_aggregate first: on a missing doc the merged increment would
+    create an aggregate holding only this one delta.
+    """
+    if not amount:
+        return
+    ref = aggregate_ref(db, user_id)
+    data = {"userId": user_id, **position_delta(amount, start, daily_rate)}
+    if batch is not None:
+        batch.set(ref, data, merge=True)
+    else:
+        ref.set(data, merge=True)
+
+
+def value_from_aggregate(aggregate: Dict[str, Any], daily_rate: float, annual_rate: float,
+                         now: Optional[datetime] = None) -> dict:
+    """Portfolio summary from the aggregate doc in constant time"""
+    growth = (1 + daily_rate) ** day_index(now or datetime.now())
+    total_invested = aggregate.get("totalInvested", 0.0)
+    current_value = growth * aggregate.get("discountedSum", 0.0)
+    # Guard against float residue once every position has been refunded or withdrawn
+    if abs(total_invested) < 1e-9:
+        total_invested = 0.0
+    if abs(current_value) < 1e-6:
+        current_value = 0.0
+    return summarize(total_invested, current_value, annual_rate)
+
+
+def principal_positions(investments: List[Dict[str, Any]], withdrawals: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Position rows (userId, amount, timestamp) at the principal each one currently contributes"""
+    rows = [{"userId": d.get("userId"), "amount": effective_amount(d), "timestamp": d.get("timestamp")}
+            for d in investments]
+    # Completed withdrawals are negative positions starting the day they were paid out
+    rows += [{"userId": w.get("userId"), "amount": -w.get("amount", 0), "timestamp": w.get("completedAt")}
+             for w in withdrawals if w.get("status") == "completed"]
+    return rows
+
+
+def compute_aggregate(db, user_id: str, daily_rate: float) -> Dict[str, Any]:
+    """A user's aggregate recomputed from the raw `investments` and `withdrawals` collections"""
+    docs = [inv.to_dict() for inv in db.collection("investments").where("userId", "==", user_id).stream()]
+    withdrawals = [w.to_dict() for w in db.collection("withdrawals").where("userId", "==", user_id).stream()]
+    positions = Positions.from_docs(principal_positions(docs, withdrawals), default_start=datetime.now())
+    amounts = positions.amounts
+    days = (positions.start_dates.astype("datetime64[D]") - BASE_DATE) // ONE_DAY
+    return {
+        "userId": user_id,
+        "totalInvested": float(amounts.sum()),
+        "discountedSum": float((amounts * np.power(1 + daily_rate, -days.astype(np.float64))).sum()),
+        "held": float(sum(w.get("amount", 0) for w in withdrawals if w.get("status") == "pending")),
+        "positions": len(docs),
+        "updatedAt": datetime.now().isoformat(),
+        "reconciledAt": datetime.now().isoformat(),
+    }
+
+
+# Users whose aggregate this process has seen or created; aggregates are never deleted
+_bootstrapped: set = set()
+BOOTSTRAPPED_CACHE_SIZE = 100000
+
+
+def ensure_aggregate(db, user_id: str, daily_rate: float) -> Optional[Dict[str, Any]]:
+    """Create a user's aggregate from raw documents if it doesn't exist yet
+
+    Every writer calls this before committing a position change. Raw documents
+    and their increment are committed together, so a racing writer either
+    created the aggregate before committing (our create() then fails and its
+    doc is kept) or its raw write is already part of what we computed.
+    Returns the aggregate when it was read or built here, None when cached.
+    """
+    if user_id in _bootstrapped:
+        return None
+    ref = aggregate_ref(db, user_id)
+    doc = ref.get()
+    if doc.exists:
+        aggregate = doc.to_dict()
+    else:
+        aggregate = compute_aggregate(db, user_id, daily_rate)
+        try:
+            ref.create(aggregate)
+        except AlreadyExists:
+            aggregate = ref.get().to_dict()
+    if len(_bootstrapped) >= BOOTSTRAPPED_CACHE_SIZE:
+        _bootstrapped.clear()
+    _bootstrapped.add(user_id)
+    return aggregate
+
+
+def rebuild_aggregate(db, user_id: str, daily_rate: float) -> Dict[str, Any]:
+    """Recompute a user's aggregate from raw documents and overwrite it
+
+    The aggregate is read inside the transaction before the raw documents, so
+    a writer's raw-doc-plus-increment commit lands entirely before the rebuild
+    (and is counted by it) or entirely after (and increments the rebuilt doc).
+    """
+    ref = aggregate_ref(db, user_id)
+
+    @firestore.transactional
+    def rebuild(transaction):
+        ref.get(transaction=transaction)
+        aggregate = compute_aggregate(db, user_id, daily_rate)
+        transaction.set(ref, aggregate)
+        return aggregate
+
+    return rebuild(db.transaction())
+
+
+def read_portfolio(db, user_id: str, daily_rate: float, annual_rate: float) -> dict:
+    """Single doc read; builds the aggregate on first access for users that predate it"""
+    doc = aggregate_ref(db, user_id).get()
+    if doc.exists:
+        aggregate = doc.to_dict()
+    else:
+        _bootstrapped.discard(user_id)
+        aggregate = ensure_aggregate(db, user_id, daily_rate)
+    return value_from_aggregate(aggregate, daily_rate, annual_rate)
+
+
+def reconcile_all(db, daily_rate: float, tolerance: float = 0.01) -> Dict[str, int]:
+    """Rebuild every user's aggregate from raw investments and report drift"""
+    user_ids = {inv.get("userId") for inv in db.collection("investments").select(["userId"]).stream()}
+    user_ids.discard(None)
+    drifted = 0
+    for user_id in user_ids:
+        doc = aggregate_ref(db, user_id).get()
+        before = doc.to_dict() if doc.exists else {}
+        after = rebuild_aggregate(db, user_id, daily_rate)
+        if abs(before.get("totalInvested", 0.0) - after["totalInvested"]) > tolerance:
+            drifted += 1
+            print(f"⚠️ Portfolio aggregate drift for {user_id}: "
+                  f"{before.get('totalInvested', 0.0)} -> {after['totalInvested']}")
+    return {"users": len(user_ids), "drifted": drifted}
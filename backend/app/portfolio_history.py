@@ -0,0 +1,82 @@
+import os
+import threading
+from collections import OrderedDict
+from datetime import date
+from typing import Any, Dict, Iterable, List, Tuple
+
+import numpy as np
+
+from .portfolio_aggregate import effective_amount
+from .valuation import Positions, growth_curve
+
+HISTORY_CACHE_SIZE = int(os.getenv("PORTFOLIO_HISTORY_CACHE_SIZE", "5000"))
+
+INTERVALS = {"daily": 1, "weekly": 7, "monthly": None}
+
+
+def date_grid(start: date, end: date, interval: str) -> np.ndarray:
+    """Sample dates between start and end (inclusive of end) for the given interval"""
+    first, last = np.datetime64(start, "D"), np.datetime64(end, "D")
+    if interval == "monthly":
+        months = np.arange(np.datetime64(start, "M"), np.datetime64(end, "M") + 1)
+        # Month ends, with the (partial) current month ending on `end`
+        grid = (months + 1).astype("datetime64[D]") - 1
+        grid = np.minimum(grid, last)
+    else:
+        grid = np.arange(last, first - 1, -INTERVALS[interval])[::-1]
+    return grid[grid >= first]
+
+
+def build_series(docs: Iterable[Dict[str, Any]], start: date, end: date, interval: str,
+                 daily_rate: float) -> List[Dict[str, Any]]:
+    """Portfolio value and invested principal over time for one user's investments"""
+    docs = list(docs)
+    positions = Positions.from_docs(docs)
+    positions.amounts = np.asarray([effective_amount(d) for d in docs], dtype=np.float64)
+    dates = date_grid(start, end, interval)
+    curve = growth_curve(positions, dates, daily_rate)
+    return [
+        {
+            "date": str(d),
+            "invested": round(float(invested), 2),
+            "value": round(float(value), 2),
+        }
+        for d, invested, value in zip(dates, curve["invested"], curve["value"])
+    ]
+
+
+class HistoryCache:
+    """Per-user series cache, valid until the user's next investment event or the next day"""
+
+    def __init__(self, max_size: int = HISTORY_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries: "OrderedDict[Tuple, Tuple[date, int, Any]]" = OrderedDict()
+        self._versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id: str, key: Tuple):
+        with self._lock:
+            entry = self._entries.get((user_id,) + key)
+            if entry is None:
+                return None
+            day, version, series = entry
+            if day != date.today() or version != self._versions.get(user_id, 0):
+                del self._entries[(user_id,) + key]
+                return None
+            self._entries.move_to_end((user_id,) + key)
+            return series
+
+    def put(self, user_id: str, key: Tuple, series: Any):
+        with self._lock:
+            self._entries[(user_id,) + key] = (date.today(), self._versions.get(user_id, 0), series)
+            self._entries.move_to_end((user_id,) + key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: str):
+        """Call on every investment event for the user"""
+        with self._lock:
+            self._versions[user_id] = self._versions.get(user_id, 0) + 1
+
+
+history_cache = HistoryCache()
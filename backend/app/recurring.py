@@ -0,0 +1,168 @@
+import json
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from .batch_writer import MAX_BATCH_OPS
+
+# Cadence of recurring investments created through /api/investments
+FREQUENCY_DAYS = {
+    "daily": 1, "day": 1,
+    "weekly": 7, "week": 7,
+    "biweekly": 14,
+    "monthly": 30, "month": 30,
+    "quarterly": 91,
+    "yearly": 365, "year": 365,
+}
+DEFAULT_FREQUENCY_DAYS = 30  # create_investment's default when no frequency is given
+
+PAGE_SIZE = int(os.getenv("RECURRING_PAGE_SIZE", "500"))
+# Child investment, its ledger line and the parent's advanced date
+WRITES_PER_SCHEDULE = 3
+SCHEDULES_PER_BATCH = MAX_BATCH_OPS // WRITES_PER_SCHEDULE
+RECURRING_CONCURRENCY = int(os.getenv("RECURRING_CONCURRENCY", "8"))
+CHECKPOINT_PATH = os.getenv("RECURRING_CHECKPOINT_PATH", "recurring_checkpoint.json")
+
+# Only paid-up parents spawn children; these end the schedule for good
+STOPPED_STATUSES = ("failed", "refunded", "cancelled")
+
+
+def frequency_step(frequency: Optional[str]) -> timedelta:
+    return timedelta(days=FREQUENCY_DAYS.get((frequency or "").lower(), DEFAULT_FREQUENCY_DAYS))
+
+
+def first_recurring_date(frequency: Optional[str]) -> str:
+    return (datetime.now() + frequency_step(frequency)).isoformat()
+
+
+def advance(next_date: str, frequency: Optional[str], cutoff: datetime) -> str:
+    """Next run after `cutoff`; periods missed while the scheduler was down are skipped"""
+    step = frequency_step(frequency)
+    current = datetime.fromisoformat(next_date)
+    while current <= cutoff:
+        current += step
+    return current.isoformat()
+
+
+class Checkpoint:
+    """Progress of a scheduler run, persisted locally so a crashed run can resume"""
+
+    def __init__(self, path: str = CHECKPOINT_PATH):
+        self.path = Path(path)
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        if not self.path.exists():
+            return None
+        return json.loads(self.path.read_text())
+
+    def save(self, state: Dict[str, Any]):
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(state))
+        tmp.replace(self.path)  # atomic on POSIX
+
+    def clear(self):
+        self.path.unlink(missing_ok=True)
+
+
+class RecurringScheduler:
+    """Executes due recurring investments in batches
+
+    Due parents are paged with an indexed query on (recurring, nextRecurringDate).
+    For each active one a new pending investment, its ledger line and the parent's
+    advanced nextRecurringDate are committed in one batch. Children stay out of the
+    portfolio aggregate (`inAggregate: False`) until their payment succeeds. Child
+    IDs are derived from the parent and due date, so re-running a batch after a
+    crash can never create the same investment twice.
+    """
+
+    def __init__(self, db, concurrency: int = RECURRING_CONCURRENCY, checkpoint: Optional[Checkpoint] = None):
+        self.db = db
+        self.concurrency = concurrency
+        self.checkpoint = checkpoint or Checkpoint()
+
+    def _due_page(self, cutoff: str, cursor: Optional[List[str]]):
+        query = (self.db.collection("investments")
+                 .where("recurring", "==", True)
+                 .where("nextRecurringDate", "<=", cutoff)
+                 .order_by("nextRecurringDate")
+                 .order_by("__name__")
+                 .limit(PAGE_SIZE))
+        if cursor:
+            query = query.start_after({"nextRecurringDate": cursor[0], "__name__": cursor[1]})
+        return list(query.stream())
+
+    def _commit_chunk(self, docs, cutoff: datetime) -> int:
+        batch = self.db.batch()
+        executed = 0
+        now = datetime.now().isoformat()
+        for doc in docs:
+            parent = doc.to_dict()
+            next_date = advance(parent["nextRecurringDate"], parent.get("frequency"), cutoff)
+            if parent.get("status") in STOPPED_STATUSES:
+                batch.update(doc.reference, {"nextRecurringDate": None, "recurringStoppedAt": now})
+                continue
+            if parent.get("status") != "active":
+                # The parent itself isn't paid yet; skip this period rather than pile up unpaid children
+                batch.update(doc.reference, {"nextRecurringDate": next_date})
+                continue
+
+            user_id, amount = parent["userId"], parent["amount"]
+            due = parent["nextRecurringDate"]
+            investment_id = f"{doc.id}_{due[:10]}"
+            batch.set(self.db.collection("investments").document(investment_id), {
+                "investmentId": investment_id,
+                "userId": user_id,
+                "amount": amount,
+                "timestamp": now,
+                "status": "pending",
+                "recurring": False,
+                "parentInvestmentId": doc.id,
+                "scheduledFor": due,
+                "inAggregate": False,
+            })
+            transaction_id = str(uuid.uuid5(uuid.NAMESPACE_URL, f"recurring/{investment_id}"))
+            batch.set(self.db.collection("transactions").document(transaction_id), {
+                "transactionId": transaction_id,
+                "userId": user_id,
+                "type": "investment",
+                "amount": amount,
+                "status": "pending",
+                "timestamp": now,
+                "metadata": {"investmentId": investment_id, "recurring": True, "parentInvestmentId": doc.id},
+            })
+            batch.update(doc.reference, {"nextRecurringDate": next_date, "lastRecurringRun": now})
+            executed += 1
+        batch.commit()
+        return executed
+
+    def run(self, resume: bool = True) -> Dict[str, Any]:
+        """Process everything due; resumes an interrupted run from its checkpoint"""
+        state = self.checkpoint.load() if resume else None
+        if state:
+            print(f"🔄 Resuming recurring run from {state['cursor']} ({state['executed']} executed so far)")
+        else:
+            state = {"cutoff": datetime.now().isoformat(), "cursor": None, "executed": 0, "pages": 0}
+        cutoff = datetime.fromisoformat(state["cutoff"])
+        started = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            while True:
+                docs = self._due_page(state["cutoff"], state["cursor"])
+                if not docs:
+                    break
+                last = docs[-1]
+                cursor = [last.get("nextRecurringDate"), last.id]
+                chunks = [docs[i:i + SCHEDULES_PER_BATCH] for i in range(0, len(docs), SCHEDULES_PER_BATCH)]
+                # Raises if any chunk failed, leaving the checkpoint at the previous page
+                state["executed"] += sum(pool.map(lambda chunk: self._commit_chunk(chunk, cutoff), chunks))
+                state["cursor"] = cursor
+                state["pages"] += 1
+                self.checkpoint.save(state)
+
+        self.checkpoint.clear()
+        state["seconds"] = round(time.perf_counter() - started, 2)
+        return state
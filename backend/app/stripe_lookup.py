@@ -0,0 +1,114 @@
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import stripe
+
+from .metrics import registry
+
+STRIPE_LOOKUP_TTL_SECONDS = float(os.getenv("STRIPE_LOOKUP_TTL_SECONDS", "300"))
+STRIPE_LOOKUP_CACHE_SIZE = int(os.getenv("STRIPE_LOOKUP_CACHE_SIZE", "10000"))
+
+
+class TTLCache:
+    """Bounded LRU whose entries expire `ttl` seconds after being stored"""
+
+    def __init__(self, ttl: float, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: "OrderedDict[Any, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+class StripeClient:
+    """Thin wrapper over the stripe library so tests can swap in FakeStripeClient"""
+
+    def retrieve_payment_intent(self, payment_intent_id: str):
+        return stripe.PaymentIntent.retrieve(payment_intent_id)
+
+    def retrieve_customer(self, customer_id: str):
+        return stripe.Customer.retrieve(customer_id)
+
+
+class StripeLookup:
+    """Cached, coalesced metadata lookups for Stripe objects
+
+    Identical lookups already in flight share one outbound call, and results are
+    kept for STRIPE_LOOKUP_TTL_SECONDS. Blocking library calls run off the event loop.
+    """
+
+    def __init__(self, client=None, ttl: float = STRIPE_LOOKUP_TTL_SECONDS,
+                 max_size: int = STRIPE_LOOKUP_CACHE_SIZE):
+        self.client = client or StripeClient()
+        self._cache = TTLCache(ttl, max_size)
+        self._in_flight: Dict[Tuple[str, str], asyncio.Future] = {}
+        self.hits = registry.counter("stripe_lookup_hits", "Stripe lookups served from cache")
+        self.calls = registry.counter("stripe_lookup_calls", "Outbound Stripe retrieve calls")
+
+    async def _lookup(self, kind: str, object_id: str, fetch: Callable[[str], Any]) -> Dict[str, Any]:
+        key = (kind, object_id)
+        metadata = self._cache.get(key)
+        if metadata is not None:
+            self.hits.inc()
+            return metadata
+        if key in self._in_flight:
+            self.hits.inc()
+            return await asyncio.shield(self._in_flight[key])
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            self.calls.inc()
+            obj = await asyncio.to_thread(fetch, object_id)
+            metadata = plain_metadata(obj.metadata)
+            self._cache.put(key, metadata)
+            future.set_result(metadata)
+            return metadata
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved so the loop doesn't warn when no one else was waiting
+            future.exception()
+            raise
+        finally:
+            del self._in_flight[key]
+
+    async def payment_intent_metadata(self, payment_intent_id: str) -> Dict[str, Any]:
+        return await self._lookup("payment_intent", payment_intent_id, self.client.retrieve_payment_intent)
+
+    async def customer_metadata(self, customer_id: str) -> Dict[str, Any]:
+        return await self._lookup("customer", customer_id, self.client.retrieve_customer)
+
+
+def plain_metadata(metadata: Any) -> Dict[str, Any]:
+    """Metadata as a plain dict; StripeObject is no longer a dict subclass since stripe v15"""
+    if hasattr(metadata, "to_dict"):
+        return metadata.to_dict()
+    return dict(metadata or {})
+
+
+def metadata_with(obj: Dict[str, Any], required: str) -> Optional[Dict[str, Any]]:
+    """The object's own metadata if it already carries `required`, else None"""
+    metadata = obj.get("metadata") or {}
+    return dict(metadata) if metadata.get(required) else None
@@ -0,0 +1,110 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import firebase_admin
+from firebase_admin import auth
+
+# Public certificates Google signs Firebase ID tokens with
+ID_TOKEN_CERT_URI = "https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com"
+
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+CERT_REFRESH_SECONDS = int(os.getenv("CERT_REFRESH_SECONDS", "3600"))
+
+
+class TokenCache:
+    """Bounded LRU cache of decoded Firebase ID tokens, valid until their `exp` claim"""
+
+    def __init__(self, max_size: int = TOKEN_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(id_token: str) -> str:
+        # Never keep raw bearer tokens in memory longer than the request
+        return hashlib.sha256(id_token.encode("utf-8")).hexdigest()
+
+    def get(self, id_token: str) -> Optional[Dict[str, Any]]:
+        key = self._key(id_token)
+        with self._lock:
+            decoded = self._entries.get(key)
+            if decoded is None:
+                self.misses += 1
+                return None
+            if decoded.get("exp", 0) <= time.time():
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return decoded
+
+    def put(self, id_token: str, decoded: Dict[str, Any]):
+        if decoded.get("exp", 0) <= time.time():
+            return
+        key = self._key(id_token)
+        with self._lock:
+            self._entries[key] = decoded
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+class CertificateRefresher:
+    """Keeps Google's signing certificates warm in the Firebase verifier's HTTP cache"""
+
+    def __init__(self, interval_seconds: int = CERT_REFRESH_SECONDS):
+        self.interval_seconds = interval_seconds
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def refresh(self):
+        """Fetch the certificates through the same cache-control session verify_id_token uses"""
+        try:
+            client = auth._get_client(firebase_admin.get_app())
+            client._token_verifier.request(ID_TOKEN_CERT_URI)
+        except Exception as e:
+            print(f"⚠️ Signing certificate refresh failed: {str(e)}")
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.refresh()
+            self._stop.wait(self.interval_seconds)
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="cert-refresher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+
+token_cache = TokenCache()
+cert_refresher = CertificateRefresher()
+
+
+def verify_id_token_cached(id_token: str) -> Dict[str, Any]:
+    """Verify a Firebase ID token, reusing the decoded claims while the token is still valid"""
+    decoded = token_cache.get(id_token)
+    if decoded is not None:
+        return decoded
+    decoded = auth.verify_id_token(id_token)
+    token_cache.put(id_token, decoded)
+    return decoded
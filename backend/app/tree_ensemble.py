@@ -0,0 +1,196 @@
+import json
+from typing import Any, List, Optional, Tuple
+
+import numpy as np
+
+# Tree ensembles flattened into contiguous node arrays
+#
+# Every tree of the model is appended to one set of arrays (split feature,
+# threshold, left child, missing-value direction, leaf value); `roots` holds
+# each tree's first node. Nodes are renumbered so a right child always follows
+# its left sibling, which makes one step `child[node] + go_right`. Evaluation
+# advances all (row, tree) pairs one level per step, so a batch costs `depth`
+# vectorized steps instead of a Python/C++ call chain per row.
+
+LEAF = -1
+
+
+class CompiledEnsemble:
+    """Array-backed evaluator for an XGBoost binary classifier or a sklearn RandomForestClassifier
+
+    Build with `from_model`; `predict` returns the same labels as the source
+    model's `predict`.
+    """
+
+    def __init__(self, kind: str, roots: np.ndarray, feature: np.ndarray, threshold: np.ndarray,
+                 child: np.ndarray, default_left: np.ndarray, value: np.ndarray,
+                 max_depth: int, n_features: int, classes: np.ndarray, base_margin: float = 0.0):
+        self.kind = kind
+        self.roots = roots
+        self.feature = feature
+        self.threshold = threshold
+        self.child = child
+        self.default_left = default_left
+        self.value = value
+        self.max_depth = max_depth
+        self.n_features = n_features
+        self.classes = classes
+        self.base_margin = base_margin
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.roots)
+
+    @classmethod
+    def from_model(cls, model: Any) -> "CompiledEnsemble":
+        if hasattr(model, "get_booster"):
+            return cls.from_xgboost(model)
+        if hasattr(model, "estimators_"):
+            return cls.from_forest(model)
+        raise TypeError(f"Cannot compile {type(model).__name__}")
+
+    @classmethod
+    def from_xgboost(cls, model: Any) -> "CompiledEnsemble":
+        learner = json.loads(model.get_booster().save_raw(raw_format="json"))["learner"]
+        if learner["objective"]["name"] != "binary:logistic":
+            raise TypeError(f"Unsupported XGBoost objective: {learner['objective']['name']}")
+        booster = learner["gradient_booster"]
+        if booster["name"] != "gbtree":
+            raise TypeError(f"Unsupported XGBoost booster: {booster['name']}")
+        trees = booster["model"]["trees"]
+        best_iteration = getattr(model, "best_iteration", None)
+        if best_iteration is not None:
+            # sklearn's predict stops at the best iteration after early stopping
+            indptr = booster["model"]["iteration_indptr"]
+            trees = trees[:indptr[best_iteration + 1]]
+        if any(any(t["split_type"]) for t in trees):
+            raise TypeError("Categorical splits are not supported")
+
+        # base_score is stored as a probability, "[2.9E-1]" in newer versions
+        base_score = float(learner["learner_model_param"]["base_score"].strip("[]"))
+        nodes = [(np.asarray(t["split_indices"]), np.asarray(t["split_conditions"], dtype=np.float32),
+                  np.asarray(t["left_children"]), np.asarray(t["right_children"]),
+                  np.asarray(t["default_left"], dtype=bool)) for t in trees]
+        # Leaves keep their weight in split_conditions
+        values = [np.where(left == LEAF, cond, 0.0) for _, cond, left, _, _ in nodes]
+        return cls._concat("xgboost", nodes, values, int(learner["learner_model_param"]["num_feature"]),
+                           np.asarray(model.classes_), base_margin=float(np.log(base_score / (1 - base_score))))
+
+    @classmethod
+    def from_forest(cls, model: Any) -> "CompiledEnsemble":
+        nodes, values = [], []
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            # Leaf class distributions, normalized since older sklearn stores raw counts
+            proba = tree.value[:, 0, :]
+            proba = proba / np.maximum(proba.sum(axis=1, keepdims=True), 1e-300)
+            missing_left = getattr(tree, "missing_go_to_left", np.ones(tree.node_count, dtype=np.uint8))
+            nodes.append((tree.feature, tree.threshold, tree.children_left, tree.children_right,
+                          np.asarray(missing_left, dtype=bool)))
+            values.append(proba)
+        return cls._concat("forest", nodes, values, model.n_features_in_, np.asarray(model.classes_))
+
+    @classmethod
+    def _concat(cls, kind: str, nodes: List[tuple], values: List[np.ndarray], n_features: int,
+                classes: np.ndarray, base_margin: float = 0.0) -> "CompiledEnsemble":
+        roots, features, thresholds, children, defaults, leaf_values, depth = [], [], [], [], [], [], 0
+        size = 0
+        for (feature, threshold, left, right, default_left), value in zip(nodes, values):
+            order, tree_depth = _sibling_order(np.asarray(left), np.asarray(right))
+            left = np.asarray(left)[order]
+            is_leaf = left == LEAF
+            # New position of every node; right children sit right after their left sibling
+            position = np.empty(len(order), dtype=np.int64)
+            position[order] = np.arange(len(order))
+            roots.append(size)
+            features.append(np.where(is_leaf, 0, np.asarray(feature)[order]))
+            # A NaN threshold never compares true, so finished walks stay on their leaf
+            thresholds.append(np.where(is_leaf, np.nan, np.asarray(threshold)[order]))
+            children.append(size + np.where(is_leaf, np.arange(len(order)), position[np.where(is_leaf, 0, left)]))
+            defaults.append(np.asarray(default_left)[order] | is_leaf)
+            leaf_values.append(np.asarray(value)[order])
+            depth = max(depth, tree_depth)
+            size += len(order)
+        return cls(
+            kind=kind,
+            roots=np.asarray(roots, dtype=np.int32),
+            feature=np.concatenate(features).astype(np.int32),
+            threshold=np.concatenate(thresholds).astype(np.float32 if kind == "xgboost" else np.float64),
+            child=np.concatenate(children).astype(np.int32),
+            default_left=np.concatenate(defaults),
+            value=np.concatenate(leaf_values),
+            max_depth=depth,
+            n_features=n_features,
+            classes=classes,
+            base_margin=base_margin,
+        )
+
+    def leaves(self, X: np.ndarray) -> np.ndarray:
+        """(rows, trees) index of the leaf each row reaches in each tree"""
+        # Both libraries split on float32 features; sklearn compares them to float64 thresholds
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f"Expected an array of shape (n, {self.n_features}), got {X.shape}")
+        if self.kind == "forest":
+            X = X.astype(np.float64)
+        flat = X.ravel()
+        row_start = (np.arange(len(X), dtype=np.int32) * self.n_features)[:, None]
+        has_missing = bool(np.isnan(flat).any())
+        node = np.broadcast_to(self.roots, (len(X), self.n_trees)).copy()
+        for _ in range(self.max_depth):
+            x = flat.take(row_start + self.feature.take(node))
+            threshold = self.threshold.take(node)
+            # XGBoost goes left on x < threshold, sklearn on x <= threshold; NaN compares false
+            go_right = x >= threshold if self.kind == "xgboost" else x > threshold
+            if has_missing:
+                go_right |= np.isnan(x) & ~self.default_left.take(node)
+            node = self.child.take(node) + go_right
+        return node
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        node = self.leaves(X)
+        if self.kind == "xgboost":
+            margin = self.base_margin + self.value.take(node).sum(axis=1, dtype=np.float64)
+            positive = 1.0 / (1.0 + np.exp(-margin))
+            return np.column_stack([1.0 - positive, positive])
+        return self.value[node].mean(axis=1)
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        return self.classes[np.argmax(self.predict_proba(X), axis=1)]
+
+
+def _sibling_order(left: np.ndarray, right: np.ndarray) -> Tuple[np.ndarray, int]:
+    """Breadth-first node order that places each right child after its left sibling, and the tree depth"""
+    order, level, depth = [0], [0], 0
+    while True:
+        level = [c for n in level if left[n] != LEAF for c in (left[n], right[n])]
+        if not level:
+            return np.asarray(order), depth
+        order.extend(level)
+        depth += 1
+
+
+def compile_model(model: Any, check_rows: int = 512, seed: int = 0) -> Optional[CompiledEnsemble]:
+    """Compiled evaluator for `model`, or None if it is unsupported or disagrees with model.predict
+
+    Parity is checked on random rows spanning several orders of magnitude,
+    plus a few missing values, before the evaluator is trusted.
+    """
+    try:
+        compiled = CompiledEnsemble.from_model(model)
+    except Exception as e:
+        print(f"⚠️ Could not compile {type(model).__name__}: {str(e)}")
+        return None
+    X = parity_rows(compiled.n_features, check_rows, seed)
+    mismatches = int((compiled.predict(X) != model.predict(X)).sum())
+    if mismatches:
+        print(f"⚠️ Compiled {type(model).__name__} disagrees with predict on {mismatches}/{check_rows} rows")
+        return None
+    return compiled
+
+
+def parity_rows(n_features: int, n_rows: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    X = rng.random((n_rows, n_features)) * 10.0 ** rng.integers(-1, 6, size=(n_rows, n_features))
+    X[rng.random(X.shape) < 0.01] = np.nan
+    return X
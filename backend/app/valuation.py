@@ -0,0 +1,121 @@
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+ONE_DAY = np.timedelta64(1, "D")
+
+
+def to_naive_iso(value: Any) -> Optional[str]:
+    """Normalize a stored timestamp to a naive local ISO string numpy can parse"""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        if any(c in value[19:] for c in "Z+-"):
+            value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        else:
+            return value
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone().replace(tzinfo=None)
+        return value.isoformat()
+    return None
+
+
+class Positions:
+    """Column-oriented view of a set of investments"""
+
+    def __init__(self, amounts: np.ndarray, start_dates: np.ndarray, owners: Optional[np.ndarray] = None):
+        self.amounts = amounts
+        self.start_dates = start_dates
+        self.owners = owners
+
+    @classmethod
+    def from_docs(cls, docs: Iterable[Dict[str, Any]], default_start: Optional[datetime] = None,
+                  owner_field: Optional[str] = None) -> "Positions":
+        """Build arrays from investment dicts; missing timestamps fall back to `default_start` (NaT if None)"""
+        amounts: List[float] = []
+        starts: List[Optional[str]] = []
+        owners: List[str] = []
+        default_iso = default_start.isoformat() if default_start else None
+        for data in docs:
+            amounts.append(data.get("amount", 0) or 0)
+            starts.append(to_naive_iso(data.get("timestamp")) or default_iso)
+            if owner_field:
+                owners.append(data.get(owner_field))
+        return cls(
+            np.asarray(amounts, dtype=np.float64),
+            np.array([s if s is not None else "NaT" for s in starts], dtype="datetime64[us]"),
+            np.asarray(owners, dtype=object) if owner_field else None,
+        )
+
+    def __len__(self):
+        return len(self.amounts)
+
+
+def value_positions(positions: Positions, daily_rate: float, now: Optional[datetime] = None) -> Dict[str, np.ndarray]:
+    """Compute whole days invested, returns and current value for every position in one pass"""
+    now64 = np.datetime64(now or datetime.now(), "us")
+    valid = ~np.isnat(positions.start_dates)
+    days = np.zeros(len(positions), dtype=np.int64)
+    days[valid] = (now64 - positions.start_dates[valid]) // ONE_DAY
+    returns = positions.amounts * (np.power(1 + daily_rate, days) - 1)
+    return {
+        "days": days,
+        "returns": returns,
+        "current_value": positions.amounts + returns,
+        "valid": valid,
+    }
+
+
+def summarize(total_invested: float, current_value: float, annual_rate: float) -> dict:
+    """Portfolio summary in the shape returned by /api/portfolio"""
+    return {
+        "total_invested": round(total_invested, 2),
+        "current_value": round(current_value, 2),
+        "total_returns": round(current_value - total_invested, 2),
+        "return_percentage": round(((current_value / total_invested) - 1) * 100, 2) if total_invested > 0 else 0.0,
+        "annual_rate": round(annual_rate * 100, 2)
+    }
+
+
+def value_portfolios(docs: Iterable[Dict[str, Any]], daily_rate: float, annual_rate: float,
+                     now: Optional[datetime] = None) -> Dict[str, dict]:
+    """Bulk mode: value positions of many users at once, grouped by `userId`"""
+    now = now or datetime.now()
+    positions = Positions.from_docs(docs, default_start=now, owner_field="userId")
+    if not len(positions):
+        return {}
+    valued = value_positions(positions, daily_rate, now)
+    user_ids, index = np.unique(positions.owners.astype(str), return_inverse=True)
+    invested = np.bincount(index, weights=positions.amounts, minlength=len(user_ids))
+    current = np.bincount(index, weights=valued["current_value"], minlength=len(user_ids))
+    return {
+        user_id: summarize(float(invested[i]), float(current[i]), annual_rate)
+        for i, user_id in enumerate(user_ids)
+    }
+
+
+def growth_curve(positions: Positions, dates: np.ndarray, daily_rate: float) -> Dict[str, np.ndarray]:
+    """Invested principal and compounded value on each of `dates` (datetime64[D]) in one cumulative pass"""
+    valid = ~np.isnat(positions.start_dates)
+    start_days = positions.start_dates[valid].astype("datetime64[D]")
+    amounts = positions.amounts[valid]
+    order = np.argsort(start_days, kind="stable")
+    start_days, amounts = start_days[order], amounts[order]
+
+    # Measure days from the first grid point to keep the discount factors near 1
+    origin = dates[0] if len(dates) else np.datetime64("today", "D")
+    offsets = (start_days - origin) // ONE_DAY
+    discounted = np.cumsum(amounts * np.power(1 + daily_rate, -offsets.astype(np.float64)))
+    invested = np.cumsum(amounts)
+
+    # Number of positions already started on each grid date
+    started = np.searchsorted(start_days, dates, side="right")
+    has_any = started > 0
+    grid_offsets = ((dates - origin) // ONE_DAY).astype(np.float64)
+    value = np.zeros(len(dates))
+    total = np.zeros(len(dates))
+    value[has_any] = np.power(1 + daily_rate, grid_offsets[has_any]) * discounted[started[has_any] - 1]
+    total[has_any] = invested[started[has_any] - 1]
+    return {"invested": total, "value": value}
@@ -0,0 +1,208 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from typing import Awaitable, Callable, List, Optional
+
+from .metrics import LATENCY_BUCKETS, registry
+
+WEBHOOK_QUEUE_PATH = os.getenv("WEBHOOK_QUEUE_PATH", "webhook_queue.db")
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "8"))
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "5"))
+POLL_INTERVAL_SECONDS = 1.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS webhook_events (
+    event_id    TEXT PRIMARY KEY,
+    type        TEXT NOT NULL,
+    payload     TEXT NOT NULL,
+    status      TEXT NOT NULL DEFAULT 'queued',
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    error       TEXT,
+    received_at REAL NOT NULL,
+    updated_at  REAL NOT NULL,
+    available_at REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_webhook_events_status ON webhook_events (status, received_at);
+"""
+
+
+class WebhookQueue:
+    """Durable local queue of verified Stripe events (SQLite, survives restarts)
+
+    Events move queued -> processing -> done, or back to queued on error until
+    WEBHOOK_MAX_ATTEMPTS is reached, after which they stay `failed` until replayed.
+    """
+
+    def __init__(self, path: str = WEBHOOK_QUEUE_PATH):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def _execute(self, sql: str, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def enqueue(self, event_id: str, event_type: str, payload: str) -> bool:
+        """Store an event; returns False if it was already queued (duplicate delivery)"""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO webhook_events (event_id, type, payload, received_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (event_id, event_type, payload, now, now),
+            )
+            return cursor.rowcount == 1
+
+    def claim(self, limit: int) -> List[tuple]:
+        """Mark up to `limit` queued events as processing and return (event_id, payload, received_at)"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute(
+                    "SELECT event_id, payload, received_at FROM webhook_events "
+                    "WHERE status = 'queued' AND available_at <= ? ORDER BY received_at LIMIT ?",
+                    (time.time(), limit),
+                ).fetchall()
+                self._conn.executemany(
+                    "UPDATE webhook_events SET status = 'processing', attempts = attempts + 1, updated_at = ? "
+                    "WHERE event_id = ?",
+                    [(time.time(), row[0]) for row in rows],
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return rows
+
+    def mark_done(self, event_id: str):
+        self._execute(
+            "UPDATE webhook_events SET status = 'done', error = NULL, updated_at = ? WHERE event_id = ?",
+            (time.time(), event_id),
+        )
+
+    def mark_error(self, event_id: str, error: str):
+        """Requeue with exponential backoff, or park as failed once attempts are exhausted"""
+        now = time.time()
+        self._execute(
+            "UPDATE webhook_events SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END, "
+            "error = ?, updated_at = ?, available_at = ? + (1 << attempts) WHERE event_id = ?",
+            (WEBHOOK_MAX_ATTEMPTS, error, now, now, event_id),
+        )
+
+    def recover(self) -> int:
+        """Requeue events left in `processing` by a crashed worker"""
+        with self._lock:
+            return self._conn.execute(
+                "UPDATE webhook_events SET status = 'queued', updated_at = ? WHERE status = 'processing'",
+                (time.time(),),
+            ).rowcount
+
+    def replay(self, event_ids: Optional[List[str]] = None) -> int:
+        """Requeue the given events, or every failed event, with a fresh attempt budget"""
+        with self._lock:
+            if event_ids:
+                placeholders = ",".join("?" * len(event_ids))
+                sql = (f"UPDATE webhook_events SET status = 'queued', attempts = 0, available_at = 0, updated_at = ? "
+                       f"WHERE event_id IN ({placeholders})")
+                return self._conn.execute(sql, (time.time(), *event_ids)).rowcount
+            return self._conn.execute(
+                "UPDATE webhook_events SET status = 'queued', attempts = 0, available_at = 0, updated_at = ? "
+                "WHERE status = 'failed'",
+                (time.time(),),
+            ).rowcount
+
+    def failed(self, limit: int = 100) -> List[tuple]:
+        return self._execute(
+            "SELECT event_id, type, attempts, error, received_at FROM webhook_events "
+            "WHERE status = 'failed' ORDER BY received_at LIMIT ?",
+            (limit,),
+        )
+
+    def depth(self) -> int:
+        return self._execute("SELECT COUNT(*) FROM webhook_events WHERE status IN ('queued', 'processing')")[0][0]
+
+    def lag(self) -> float:
+        """Age in seconds of the oldest event still waiting"""
+        oldest = self._execute("SELECT MIN(received_at) FROM webhook_events WHERE status = 'queued'")[0][0]
+        return round(time.time() - oldest, 3) if oldest else 0.0
+
+    def purge_done(self, older_than_seconds: float) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "DELETE FROM webhook_events WHERE status = 'done' AND updated_at < ?",
+                (time.time() - older_than_seconds,),
+            ).rowcount
+
+
+class WebhookWorkerPool:
+    """Drains a WebhookQueue with at most `concurrency` events in flight"""
+
+    def __init__(self, queue: WebhookQueue, handler: Callable[[str], Awaitable[None]],
+                 concurrency: int = WEBHOOK_WORKERS):
+        self.queue = queue
+        self.handler = handler
+        self.concurrency = concurrency
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._in_flight: set = set()
+        self.processed = registry.counter("webhook_queue_processed", "Events processed successfully")
+        self.errors = registry.counter("webhook_queue_errors", "Event processing errors")
+        self.lag_seconds = registry.histogram(
+            "webhook_queue_lag_seconds", LATENCY_BUCKETS + [10.0, 30.0, 60.0], "Receive-to-done latency")
+        registry.gauge("webhook_queue_depth", "Events queued or in flight", fn=queue.depth)
+        registry.gauge("webhook_queue_oldest_age_seconds", "Age of the oldest queued event", fn=queue.lag)
+
+    def notify(self):
+        self._wake.set()
+
+    async def _process(self, event_id: str, payload: str, received_at: float):
+        try:
+            await self.handler(payload)
+        except Exception as e:
+            print(f"⚠️ Error processing queued webhook {event_id}: {str(e)}")
+            self.errors.inc()
+            self.queue.mark_error(event_id, str(e))
+            return
+        self.queue.mark_done(event_id)
+        self.processed.inc()
+        self.lag_seconds.observe(time.time() - received_at)
+
+    async def _run(self):
+        while True:
+            free = self.concurrency - len(self._in_flight)
+            rows = self.queue.claim(free) if free > 0 else []
+            for event_id, payload, received_at in rows:
+                task = asyncio.create_task(self._process(event_id, payload, received_at))
+                self._in_flight.add(task)
+                task.add_done_callback(self._on_done)
+            if not rows:
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), POLL_INTERVAL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+
+    def _on_done(self, task: asyncio.Task):
+        self._in_flight.discard(task)
+        self._wake.set()
+
+    def start(self):
+        recovered = self.queue.recover()
+        if recovered:
+            print(f"🔄 Requeued {recovered} webhook events interrupted by a restart")
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Stop claiming new events and let in-flight ones finish"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
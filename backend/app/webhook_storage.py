@@ -0,0 +1,102 @@
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+# Event docs only need to outlive Stripe's retry window (3 days) to deduplicate
+WEBHOOK_EVENT_RETENTION_DAYS = int(os.getenv("WEBHOOK_EVENT_RETENTION_DAYS", "7"))
+WEBHOOK_ERROR_RETENTION_DAYS = int(os.getenv("WEBHOOK_ERROR_RETENTION_DAYS", "30"))
+WEBHOOK_ARCHIVE_DIR = os.getenv("WEBHOOK_ARCHIVE_DIR", "webhook_archive")
+
+PURGE_BATCH_SIZE = 500
+
+
+def expires_at(days: int) -> datetime:
+    """Expiry timestamp; stored as a Firestore Timestamp so a TTL policy can use it"""
+    return datetime.now(timezone.utc) + timedelta(days=days)
+
+
+def compact_event_record(event_id: str, event_type: str, event_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Projection of a webhook event kept in Firestore for idempotency and lookups"""
+    metadata = event_data.get("metadata") or {}
+    return {
+        "eventId": event_id,
+        "type": event_type,
+        "objectId": event_data.get("id"),
+        "userId": metadata.get("userId"),
+        "amount": event_data.get("amount"),
+        "processedAt": datetime.now().isoformat(),
+        "expiresAt": expires_at(WEBHOOK_EVENT_RETENTION_DAYS),
+    }
+
+
+def compact_error_record(error_id: str, error: str, payload: bytes, archive_path: Optional[str]) -> Dict[str, Any]:
+    """Failed-webhook record without the payload or signature, which go to the local archive"""
+    event_id = None
+    try:
+        event_id = json.loads(payload).get("id")
+    except Exception:
+        pass
+    return {
+        "errorId": error_id,
+        "timestamp": datetime.now().isoformat(),
+        "error": error,
+        "eventId": event_id,
+        "payloadSha256": hashlib.sha256(payload).hexdigest(),
+        "archive": archive_path,
+        "expiresAt": expires_at(WEBHOOK_ERROR_RETENTION_DAYS),
+    }
+
+
+class WebhookArchive:
+    """Compressed, date-partitioned NDJSON archive of full webhook payloads
+
+    Files live at <root>/<kind>/YYYY/MM/DD.ndjson.gz. Each append adds a gzip
+    member, which `zcat`/gzip.open read back as one continuous stream.
+    """
+
+    def __init__(self, root: str = WEBHOOK_ARCHIVE_DIR):
+        self.root = Path(root)
+        self._lock = threading.Lock()
+
+    def path_for(self, kind: str, when: Optional[datetime] = None) -> Path:
+        when = when or datetime.now(timezone.utc)
+        return self.root / kind / when.strftime("%Y") / when.strftime("%m") / f"{when.strftime('%d')}.ndjson.gz"
+
+    def append(self, kind: str, record: Dict[str, Any]) -> str:
+        path = self.path_for(kind)
+        line = (json.dumps(record, default=str, separators=(",", ":")) + "\n").encode("utf-8")
+        with self._lock:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with gzip.open(path, "ab") as f:
+                f.write(line)
+        return str(path)
+
+    async def write(self, kind: str, record: Dict[str, Any]) -> Optional[str]:
+        """Append without blocking the event loop; archival failures are logged, never raised"""
+        try:
+            return await asyncio.to_thread(self.append, kind, record)
+        except Exception as e:
+            print(f"⚠️ Error archiving webhook {kind}: {str(e)}")
+            return None
+
+
+def purge_expired(db, collection: str, now: Optional[datetime] = None,
+                  batch_size: int = PURGE_BATCH_SIZE) -> int:
+    """Delete docs whose expiresAt has passed, one batch at a time"""
+    now = now or datetime.now(timezone.utc)
+    deleted = 0
+    while True:
+        docs = list(db.collection(collection).where("expiresAt", "<", now).limit(batch_size).stream())
+        if not docs:
+            return deleted
+        batch = db.batch()
+        for doc in docs:
+            batch.delete(doc.reference)
+        batch.commit()
+        deleted += len(docs)
@@ -0,0 +1,100 @@
+import uuid
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+from firebase_admin import firestore
+
+from .portfolio_aggregate import aggregate_ref, compute_aggregate, position_delta, value_from_aggregate
+
+# Withdrawal balance ledger. The user's portfolioAggregates doc also carries
+# `held`, the sum of pending withdrawals, so available = current value - held
+# comes from the one doc the portfolio read already uses. Requests, completions
+# and cancellations read and adjust it inside a Firestore transaction, which
+# serializes concurrent withdrawals for the same user.
+WITHDRAWAL_COLLECTION = "withdrawals"
+
+
+class InsufficientFunds(Exception):
+    def __init__(self, available: float):
+        super().__init__(f"Insufficient funds for withdrawal (available: {available:.2f})")
+        self.available = available
+
+
+class WithdrawalStateError(Exception):
+    """The withdrawal is no longer pending"""
+
+
+def available_balance(aggregate: Dict[str, Any], daily_rate: float, annual_rate: float) -> float:
+    current_value = value_from_aggregate(aggregate, daily_rate, annual_rate)["current_value"]
+    return round(current_value - (aggregate.get("held", 0.0) or 0.0), 2)
+
+
+def request_withdrawal(db, user_id: str, amount: float, account_id: str,
+                       daily_rate: float, annual_rate: float) -> Tuple[Dict[str, Any], float]:
+    """Hold `amount` and create a pending withdrawal; returns it with the remaining available balance"""
+    agg_ref = aggregate_ref(db, user_id)
+    withdrawal_id = str(uuid.uuid4())
+    withdrawal_ref = db.collection(WITHDRAWAL_COLLECTION).document(withdrawal_id)
+
+    @firestore.transactional
+    def hold(transaction):
+        snapshot = agg_ref.get(transaction=transaction)
+        # Users that predate the aggregate get it built from their raw documents
+        aggregate = snapshot.to_dict() if snapshot.exists else compute_aggregate(db, user_id, daily_rate)
+        available = available_balance(aggregate, daily_rate, annual_rate)
+        if amount > available:
+            raise InsufficientFunds(available)
+
+        withdrawal_data = {
+            "withdrawalId": withdrawal_id,
+            "userId": user_id,
+            "amount": amount,
+            "accountId": account_id,
+            "status": "pending",
+            "requestedAt": datetime.now().isoformat()
+        }
+        transaction.set(withdrawal_ref, withdrawal_data)
+        if snapshot.exists:
+            transaction.update(agg_ref, {"held": firestore.Increment(amount),
+                                         "updatedAt": datetime.now().isoformat()})
+        else:
+            transaction.set(agg_ref, {**aggregate, "held": aggregate.get("held", 0.0) + amount})
+        return withdrawal_data, round(available - amount, 2)
+
+    return hold(db.transaction())
+
+
+def _settle(db, withdrawal_id: str, status: str, daily_rate: float,
+            user_id: Optional[str] = None) -> Dict[str, Any]:
+    """Release a pending withdrawal's hold; completed ones also leave the portfolio"""
+    withdrawal_ref = db.collection(WITHDRAWAL_COLLECTION).document(withdrawal_id)
+
+    @firestore.transactional
+    def settle(transaction):
+        snapshot = withdrawal_ref.get(transaction=transaction)
+        withdrawal = snapshot.to_dict() if snapshot.exists else None
+        if withdrawal is None or (user_id is not None and withdrawal.get("userId") != user_id):
+            raise LookupError(f"Withdrawal {withdrawal_id} not found")
+        if withdrawal.get("status") != "pending":
+            raise WithdrawalStateError(f"Withdrawal {withdrawal_id} is already {withdrawal.get('status')}")
+
+        now = datetime.now().isoformat()
+        owner, amount = withdrawal["userId"], withdrawal["amount"]
+        transaction.update(withdrawal_ref, {"status": status, f"{status}At": now})
+        aggregate_update = {"held": firestore.Increment(-amount), "updatedAt": now}
+        if status == "completed":
+            aggregate_update.update(position_delta(-amount, now, daily_rate))
+        transaction.set(aggregate_ref(db, owner), aggregate_update, merge=True)
+        return {**withdrawal, "status": status, f"{status}At": now}
+
+    return settle(db.transaction())
+
+
+def complete_withdrawal(db, withdrawal_id: str, daily_rate: float) -> Dict[str, Any]:
+    """Mark a payout as sent: the hold is released and the amount leaves the portfolio"""
+    return _settle(db, withdrawal_id, "completed", daily_rate)
+
+
+def cancel_withdrawal(db, withdrawal_id: str, daily_rate: float, user_id: Optional[str] = None) -> Dict[str, Any]:
+    """Cancel a pending withdrawal and make its funds available again"""
+    return _settle(db, withdrawal_id, "cancelled", daily_rate, user_id)
@@ -0,0 +1,86 @@
+import asyncio
+import os
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from .firestore_io import run_db
+
+FLUSH_INTERVAL_SECONDS = float(os.getenv("FINANCIAL_INFO_FLUSH_SECONDS", "5"))
+MAX_BATCH_WRITES = 500  # Firestore limit per batched write
+LAST_WRITTEN_SIZE = int(os.getenv("FINANCIAL_INFO_CACHE_SIZE", "50000"))
+
+
+class FinancialInfoWriter:
+    """Write-behind buffer for the `financialInfo` fields read endpoints derive from the portfolio
+
+    Unchanged values are dropped, repeated updates for a user coalesce into the
+    latest one, and pending updates are flushed in batches on a timer and at shutdown.
+    """
+
+    def __init__(self, db_getter, interval: float = FLUSH_INTERVAL_SECONDS):
+        self._db_getter = db_getter
+        self.interval = interval
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._last_written: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._task: Optional[asyncio.Task] = None
+        self.skipped = 0
+        self.written = 0
+
+    def submit(self, user_id: str, fields: Dict[str, Any], current: Optional[Dict[str, Any]] = None):
+        """Queue `fields` for the user unless they match what is already stored"""
+        known = self._pending.get(user_id) or self._last_written.get(user_id)
+        if known is None and current is not None:
+            known = {k: current.get(k) for k in fields}
+        if known is not None and all(known.get(k) == v for k, v in fields.items()):
+            self.skipped += 1
+            return
+        self._pending[user_id] = dict(fields)
+
+    def forget(self, user_id: str):
+        """Drop the dirty-check baseline after the user doc was written elsewhere"""
+        self._last_written.pop(user_id, None)
+
+    def _remember(self, user_id: str, fields: Dict[str, Any]):
+        self._last_written[user_id] = fields
+        self._last_written.move_to_end(user_id)
+        while len(self._last_written) > LAST_WRITTEN_SIZE:
+            self._last_written.popitem(last=False)
+
+    async def flush(self):
+        """Commit all pending updates in batches of up to MAX_BATCH_WRITES"""
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        db = self._db_getter()
+        items = list(pending.items())
+        for i in range(0, len(items), MAX_BATCH_WRITES):
+            chunk = items[i:i + MAX_BATCH_WRITES]
+            batch = db.batch()
+            for user_id, fields in chunk:
+                batch.set(db.collection("users").document(user_id), {"financialInfo": fields}, merge=True)
+            try:
+                await run_db(batch.commit)
+            except Exception as e:
+                print(f"⚠️ Error flushing financialInfo updates: {str(e)}")
+                # Re-queue unless a newer value arrived in the meantime
+                for user_id, fields in chunk:
+                    self._pending.setdefault(user_id, fields)
+                continue
+            for user_id, fields in chunk:
+                self._remember(user_id, fields)
+            self.written += len(chunk)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
@@ -0,0 +1,57 @@
+"""
+Benchmark the auth step alone: cold (uncached) vs warm (cached) ID token verification.
+
+Usage (from backend/):
+    FIREBASE_ID_TOKEN=<token> python -m scripts.bench_auth [iterations]
+"""
+import os
+import sys
+import time
+
+import firebase_admin
+from firebase_admin import credentials
+
+from app.token_cache import token_cache, verify_id_token_cached
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def report(label, samples):
+    print(f"{label:>5}: n={len(samples)} "
+          f"p50={percentile(samples, 50) * 1000:.3f}ms "
+          f"p99={percentile(samples, 99) * 1000:.3f}ms "
+          f"mean={sum(samples) / len(samples) * 1000:.3f}ms")
+
+
+def main():
+    id_token = os.getenv("FIREBASE_ID_TOKEN")
+    if not id_token:
+        print("Set FIREBASE_ID_TOKEN to a valid Firebase ID token")
+        sys.exit(1)
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+
+    firebase_admin.initialize_app(credentials.Certificate("firebase-credentials.json"))
+
+    cold = []
+    for _ in range(iterations):
+        token_cache.clear()
+        start = time.perf_counter()
+        verify_id_token_cached(id_token)
+        cold.append(time.perf_counter() - start)
+
+    warm = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        verify_id_token_cached(id_token)
+        warm.append(time.perf_counter() - start)
+
+    report("cold", cold)
+    report("warm", warm)
+    print(f"cache: {token_cache.stats()}")
+
+
+if __name__ == "__main__":
+    main()
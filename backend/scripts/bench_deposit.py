@@ -0,0 +1,85 @@
+"""
+Load-test deposit intent creation offline and report p50/p99 latency.
+
+Usage (from backend/, with scripts/stripe_stub.py running):
+    # Stripe call path only, through the shared AsyncStripe client
+    python -m scripts.bench_deposit --stripe-base http://127.0.0.1:12111 -n 2000 -c 100
+
+    # Full /api/deposit endpoint of a running API (started with STRIPE_API_BASE pointing at the stub)
+    python -m scripts.bench_deposit --api http://127.0.0.1:8000 --token <firebase-id-token> -n 2000 -c 100
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def run(n: int, concurrency: int, call):
+    latencies, errors = [], 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await call(i)
+            except Exception as e:
+                errors += 1
+                if errors <= 3:
+                    print(f"error: {e}")
+                return
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(n)))
+    elapsed = time.perf_counter() - start
+    if latencies:
+        print(f"requests={n} errors={errors} concurrency={concurrency} "
+              f"throughput={len(latencies) / elapsed:.0f}/s "
+              f"p50={percentile(latencies, 50) * 1000:.1f}ms p99={percentile(latencies, 99) * 1000:.1f}ms")
+    else:
+        print(f"requests={n} errors={errors}: nothing succeeded")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", type=int, default=1000, help="Total requests")
+    parser.add_argument("-c", type=int, default=50, help="Concurrent requests")
+    parser.add_argument("--stripe-base", default="http://127.0.0.1:12111")
+    parser.add_argument("--api", help="Base URL of a running API to hit /api/deposit instead")
+    parser.add_argument("--token", help="Firebase ID token for --api")
+    args = parser.parse_args()
+
+    if args.api:
+        async with httpx.AsyncClient(base_url=args.api, timeout=30,
+                                     headers={"Authorization": f"Bearer {args.token}"}) as client:
+            async def call(i):
+                response = await client.post("/api/deposit", json={"amount": 10000, "currency": "inr"})
+                response.raise_for_status()
+            await run(args.n, args.c, call)
+        return
+
+    from app.stripe_client import AsyncStripe
+    stripe_async = AsyncStripe("sk_test_stub", api_base=args.stripe_base, max_concurrency=args.c)
+
+    async def call(i):
+        await stripe_async.create_payment_intent(
+            amount=10000, currency="inr", description="Account deposit",
+            metadata={"userId": f"user_{i}", "purpose": "account_deposit"},
+            automatic_payment_methods={"enabled": True},
+        )
+    try:
+        await run(args.n, args.c, call)
+    finally:
+        await stripe_async.aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,114 @@
+"""
+Show that saturating the predict endpoints no longer stalls the rest of the API.
+
+For each INFERENCE_EXECUTOR this starts the API in a subprocess with the
+withdrawal model loaded, measures GET /api/metrics latency at rest, then again
+while -c clients hammer /api/predict/withdrawal/batch. With "inline" the probe
+latency tracks predict time; with "thread" or "process" it should stay flat.
+
+Usage (from backend/):
+    python -m scripts.bench_inference --executors inline thread process -c 16 --rows 512 --seconds 5
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+import numpy as np
+
+from scripts.bench_deposit import percentile
+
+PROBE_PATH = "/api/metrics"
+
+
+def serve(executor: str, workers: int, port: int):
+    """Subprocess entry point: API with only the withdrawal model, no Firebase/Stripe start-up hooks"""
+    os.environ["INFERENCE_EXECUTOR"] = executor
+    os.environ["INFERENCE_WORKERS"] = str(workers)
+    import uvicorn
+    from app import index as api
+    from app.inference import load_model
+
+    api.MODELS["withdrawal"] = load_model("withdrawal")
+    api.inference_pool.start(["withdrawal"])
+    uvicorn.run(api.app, host="127.0.0.1", port=port, lifespan="off", log_level="warning")
+
+
+async def probe(client: httpx.AsyncClient, seconds: float) -> list:
+    latencies = []
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        (await client.get(PROBE_PATH)).raise_for_status()
+        latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(0.01)
+    return latencies
+
+
+async def hammer(client: httpx.AsyncClient, rows: list, seconds: float) -> int:
+    done = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        (await client.post("/api/predict/withdrawal/batch", json=rows)).raise_for_status()
+        done += 1
+    return done
+
+
+def summary(latencies: list) -> str:
+    return (f"p50={percentile(latencies, 50) * 1000:.1f}ms p99={percentile(latencies, 99) * 1000:.1f}ms "
+            f"max={max(latencies) * 1000:.1f}ms")
+
+
+async def bench(executor: str, args) -> None:
+    process = subprocess.Popen([sys.executable, "-m", "scripts.bench_inference", "--serve", executor,
+                                "--workers", str(args.workers), "--port", str(args.port)])
+    try:
+        limits = httpx.Limits(max_connections=args.c + 2)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", timeout=60, limits=limits) as client:
+            for _ in range(300):
+                try:
+                    (await client.get(PROBE_PATH)).raise_for_status()
+                    break
+                except httpx.HTTPError:
+                    await asyncio.sleep(0.1)
+            else:
+                raise RuntimeError("API did not come up")
+
+            from app.inference import WITHDRAWAL_FEATURES
+            rng = np.random.default_rng(0)
+            rows = [dict(zip(WITHDRAWAL_FEATURES, map(float, x))) for x in rng.random((args.rows, 10)) * 5000]
+
+            idle = await probe(client, min(args.seconds, 2))
+            results = await asyncio.gather(probe(client, args.seconds),
+                                           *(hammer(client, rows, args.seconds) for _ in range(args.c)))
+            loaded, predicted = results[0], sum(results[1:])
+            print(f"[{executor:>7}] probe idle {summary(idle)} | under load {summary(loaded)} | "
+                  f"predict {predicted * args.rows / args.seconds:.0f} rows/s")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--executors", nargs="+", default=["inline", "thread", "process"])
+    parser.add_argument("--workers", type=int, default=2, help="INFERENCE_WORKERS")
+    parser.add_argument("-c", type=int, default=16, help="Concurrent predict clients")
+    parser.add_argument("--rows", type=int, default=512, help="Rows per batch predict request")
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--port", type=int, default=8790)
+    parser.add_argument("--serve", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.workers, args.port)
+        return
+    for executor in args.executors:
+        asyncio.run(bench(executor, args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Check the compiled tree evaluator (app/tree_ensemble.py) against model.predict
+and compare their latency.
+
+Parity is checked on random rows (several orders of magnitude, ~1% missing
+values) for every model file that is present, plus a RandomForest trained on
+synthetic data so the forest path is covered even without the savings models.
+Latency is the median over --repeats calls at batch sizes 1, 64 and 4096.
+
+Usage (from backend/):
+    python -m scripts.bench_tree_eval --rows 20000 --repeats 200
+"""
+import argparse
+import time
+
+import numpy as np
+
+from app.inference import MODEL_FILES, load_model
+from app.tree_ensemble import CompiledEnsemble, parity_rows
+
+BATCH_SIZES = [1, 64, 4096]
+
+
+def synthetic_forest(n_features: int = 13, seed: int = 0):
+    from sklearn.ensemble import RandomForestClassifier
+
+    rng = np.random.default_rng(seed)
+    X = rng.random((5000, n_features)) * 10.0 ** rng.integers(0, 5, size=(5000, n_features))
+    y = (X[:, 0] > X[:, 3]).astype(int) + (X[:, 1] > X[:, 2])
+    return RandomForestClassifier(n_estimators=100, max_depth=14, n_jobs=1, random_state=seed).fit(X, y)
+
+
+def median_ms(fn, X: np.ndarray, repeats: int) -> float:
+    fn(X)
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn(X)
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings)) * 1000
+
+
+def bench(name: str, model, args) -> None:
+    compiled = CompiledEnsemble.from_model(model)
+    X = parity_rows(compiled.n_features, args.rows, args.seed)
+    mismatches = int((compiled.predict(X) != model.predict(X)).sum())
+    proba_diff = float(np.abs(compiled.predict_proba(X) - model.predict_proba(X)).max())
+    print(f"{name}: {compiled.n_trees} trees, depth {compiled.max_depth} | parity on {args.rows} rows: "
+          f"{mismatches} label mismatches, max proba diff {proba_diff:.2e}")
+    for size in BATCH_SIZES:
+        batch = X[:size]
+        library = median_ms(model.predict, batch, args.repeats)
+        flat = median_ms(compiled.predict, batch, args.repeats)
+        print(f"  batch {size:>5}: model.predict {library:8.3f}ms | compiled {flat:8.3f}ms | {library / flat:5.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20000, help="Random rows for the parity check")
+    parser.add_argument("--repeats", type=int, default=100, help="Timed calls per batch size")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    for name in MODEL_FILES:
+        try:
+            model = load_model(name, compiled=False)
+        except FileNotFoundError:
+            print(f"{name}: model file missing, skipped")
+            continue
+        bench(name, model, args)
+    bench("synthetic_forest", synthetic_forest(), args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+"""
+Load-test the Stripe webhook endpoint with signed synthetic events.
+
+Events are signed with STRIPE_WEBHOOK_SECRET exactly like Stripe does
+(Stripe-Signature: t=<ts>,v1=<hmac>) and mix payment_intent.succeeded
+(deposits), charge.refunded (investments) and customer.subscription.created,
+plus re-deliveries of earlier events. By default the app runs in-process
+against an in-memory Firestore (app/fake_firestore.py), which also reports
+Firestore round trips, reads and writes per event.
+
+Usage (from backend/):
+    python -m scripts.bench_webhooks -n 5000 --rate 500 -c 100 --duplicates 0.1
+    python -m scripts.bench_webhooks -n 5000 --mode queue --firestore-latency-ms 20
+
+    # Against a running API (latency/throughput only; seed Firestore yourself)
+    python -m scripts.bench_webhooks --url http://127.0.0.1:8000 -n 2000 --rate 200
+"""
+import argparse
+import asyncio
+import contextlib
+import hashlib
+import hmac
+import json
+import os
+import random
+import tempfile
+import time
+import uuid
+from collections import Counter
+
+import httpx
+
+from scripts.bench_deposit import percentile
+
+WEBHOOK_PATH = "/api/payments/webhook"
+EVENT_MIX = {"payment_intent.succeeded": 5, "charge.refunded": 3, "customer.subscription.created": 2}
+
+
+def sign(payload: str, secret: str, timestamp: int = None) -> str:
+    """Stripe-Signature header value for `payload`"""
+    timestamp = timestamp or int(time.time())
+    digest = hmac.new(secret.encode("utf-8"), f"{timestamp}.{payload}".encode("utf-8"), hashlib.sha256)
+    return f"t={timestamp},v1={digest.hexdigest()}"
+
+
+def event_envelope(event_type: str, obj: dict) -> dict:
+    return {
+        "id": f"evt_bench_{uuid.uuid4().hex[:24]}",
+        "object": "event",
+        "type": event_type,
+        "created": int(time.time()),
+        "livemode": False,
+        "data": {"object": obj},
+    }
+
+
+class Scenario:
+    """Builds events and, when given a Firestore client, the documents their handlers expect"""
+
+    def __init__(self, users: int, db=None, seed: int = 7):
+        self.users = [f"bench_user_{i}" for i in range(users)]
+        self.db = db
+        self.random = random.Random(seed)
+        self.sent = []
+        if db is not None:
+            for user_id in self.users:
+                db.seed("users", user_id, {"uid": user_id, "financialInfo": {"totalInvested": 0}})
+
+    def _user(self) -> str:
+        return self.random.choice(self.users)
+
+    def payment_succeeded(self) -> dict:
+        user_id, intent_id = self._user(), f"pi_bench_{uuid.uuid4().hex[:24]}"
+        if self.db is not None:
+            self.db.seed("deposits", intent_id, {
+                "depositId": intent_id, "userId": user_id, "amount": 100.0, "status": "pending",
+                "paymentIntentId": intent_id, "createdAt": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            })
+        return event_envelope("payment_intent.succeeded", {
+            "id": intent_id, "object": "payment_intent", "amount": 10000, "currency": "inr",
+            "payment_method": "pm_card_visa", "description": "Account deposit",
+            "metadata": {"userId": user_id, "purpose": "account_deposit"},
+        })
+
+    def charge_refunded(self) -> dict:
+        user_id, investment_id = self._user(), str(uuid.uuid4())
+        if self.db is not None:
+            self.db.seed("investments", investment_id, {
+                "investmentId": investment_id, "userId": user_id, "amount": 100.0, "status": "active",
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            })
+        return event_envelope("charge.refunded", {
+            "id": f"ch_bench_{uuid.uuid4().hex[:24]}", "object": "charge",
+            "payment_intent": f"pi_bench_{uuid.uuid4().hex[:24]}", "amount_refunded": 5000,
+            "metadata": {"userId": user_id, "investmentId": investment_id},
+            "refunds": {"data": [{"id": f"re_bench_{uuid.uuid4().hex[:24]}"}]},
+        })
+
+    def subscription_created(self) -> dict:
+        return event_envelope("customer.subscription.created", {
+            "id": f"sub_bench_{uuid.uuid4().hex[:24]}", "object": "subscription",
+            "customer": f"cus_bench_{uuid.uuid4().hex[:14]}", "metadata": {"userId": self._user()},
+            "current_period_end": int(time.time()) + 30 * 86400,
+            "items": {"data": [{"price": {"unit_amount": 5000, "recurring": {"interval": "month"}}}]},
+        })
+
+    def next_event(self, duplicates: float) -> tuple:
+        """(payload, is_duplicate); duplicates resend an earlier event byte for byte"""
+        if self.sent and self.random.random() < duplicates:
+            return self.random.choice(self.sent), True
+        event_type = self.random.choices(list(EVENT_MIX), weights=list(EVENT_MIX.values()))[0]
+        builders = {
+            "payment_intent.succeeded": self.payment_succeeded,
+            "charge.refunded": self.charge_refunded,
+            "customer.subscription.created": self.subscription_created,
+        }
+        payload = json.dumps(builders[event_type]())
+        self.sent.append(payload)
+        return payload, False
+
+
+async def send_all(client: httpx.AsyncClient, scenario: Scenario, secret: str, args):
+    latencies, statuses = [], Counter()
+    semaphore = asyncio.Semaphore(args.c)
+    duplicates = 0
+
+    async def deliver(payload: str):
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                response = await client.post(WEBHOOK_PATH, content=payload, headers={
+                    "Content-Type": "application/json", "Stripe-Signature": sign(payload, secret)})
+                statuses[response.json().get("status", response.status_code)] += 1
+            except Exception as e:
+                statuses[type(e).__name__] += 1
+                return
+            latencies.append(time.perf_counter() - start)
+
+    tasks = []
+    start = time.perf_counter()
+    for i in range(args.n):
+        if args.rate:
+            delay = start + i / args.rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        payload, duplicate = scenario.next_event(args.duplicates)
+        duplicates += duplicate
+        tasks.append(asyncio.create_task(deliver(payload)))
+    await asyncio.gather(*tasks)
+    return latencies, statuses, duplicates, time.perf_counter() - start
+
+
+def report(latencies, statuses, duplicates, elapsed, n):
+    print(f"events={n} (duplicates={duplicates}) elapsed={elapsed:.2f}s "
+          f"throughput={len(latencies) / elapsed:.0f}/s responses={dict(statuses)}")
+    if latencies:
+        print(f"latency p50={percentile(latencies, 50) * 1000:.1f}ms "
+              f"p95={percentile(latencies, 95) * 1000:.1f}ms p99={percentile(latencies, 99) * 1000:.1f}ms")
+
+
+async def run_remote(args):
+    secret = os.getenv("STRIPE_WEBHOOK_SECRET")
+    if not secret:
+        raise SystemExit("Set STRIPE_WEBHOOK_SECRET to the secret the API verifies with")
+    scenario = Scenario(args.users)
+    async with httpx.AsyncClient(base_url=args.url, timeout=30) as client:
+        report(*await send_all(client, scenario, secret, args), args.n)
+
+
+async def run_in_process(args):
+    workdir = tempfile.mkdtemp(prefix="bench_webhooks_")
+    os.environ.setdefault("STRIPE_WEBHOOK_SECRET", "whsec_bench")
+    os.environ["WEBHOOK_MODE"] = args.mode
+    os.environ["WEBHOOK_QUEUE_PATH"] = os.path.join(workdir, "webhook_queue.db")
+    os.environ["WEBHOOK_ARCHIVE_DIR"] = os.path.join(workdir, "webhook_archive")
+    os.environ["DEPOSIT_JOURNAL_PATH"] = os.path.join(workdir, "deposit_journal.db")
+
+    from app import index as api
+    from app.fake_firestore import FakeFirestore
+    from app.fake_stripe import FakeStripeClient
+
+    db = FakeFirestore(latency=args.firestore_latency_ms / 1000)
+    api.db = db
+    api.stripe_lookup.client = FakeStripeClient()
+    scenario = Scenario(args.users, db)
+
+    api.transaction_buffer.start()
+    if api.webhook_workers:
+        api.webhook_workers.start()
+
+    quiet = open(os.devnull, "w") if not args.verbose else None
+    with contextlib.redirect_stdout(quiet) if quiet else contextlib.nullcontext():
+        transport = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=30) as client:
+            latencies, statuses, duplicates, elapsed = await send_all(client, scenario, api.STRIPE_WEBHOOK_SECRET, args)
+        drained = elapsed
+        if api.webhook_workers:
+            start = time.perf_counter() - elapsed
+            while api.webhook_queue.depth():
+                await asyncio.sleep(0.01)
+            drained = time.perf_counter() - start
+            await api.webhook_workers.stop()
+        await api.transaction_buffer.stop()
+        api.shutdown_io()  # waits for commits still running on the I/O pool
+
+    report(latencies, statuses, duplicates, elapsed, args.n)
+    unique = args.n - duplicates
+    if api.webhook_workers:
+        print(f"queue drained after {drained:.2f}s -> processed {unique / drained:.0f} unique events/s")
+    ops = db.ops
+    print(f"firestore rpcs={ops['rpcs']} reads={ops['reads']} writes={ops['writes']} | per event: "
+          f"{ops['rpcs'] / args.n:.2f} rpcs, {ops['reads'] / args.n:.2f} reads, {ops['writes'] / args.n:.2f} writes")
+    print(f"ledger lines written={db.count('transactions')} for {unique} unique events; "
+          f"event records={db.count('webhookEvents')}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", type=int, default=2000, help="Total deliveries, duplicates included")
+    parser.add_argument("-c", type=int, default=100, help="Max deliveries in flight")
+    parser.add_argument("--rate", type=float, default=0, help="Deliveries per second (0 = as fast as possible)")
+    parser.add_argument("--duplicates", type=float, default=0.1, help="Fraction of re-deliveries")
+    parser.add_argument("--users", type=int, default=1000, help="Distinct users the events belong to")
+    parser.add_argument("--mode", choices=["inline", "queue"], default="inline", help="WEBHOOK_MODE for the app")
+    parser.add_argument("--firestore-latency-ms", type=float, default=0, help="Simulated Firestore round trip")
+    parser.add_argument("--url", help="Base URL of a running API instead of the in-process app")
+    parser.add_argument("--verbose", action="store_true", help="Keep the app's per-event logging")
+    args = parser.parse_args()
+    asyncio.run(run_remote(args) if args.url else run_in_process(args))
+
+
+if __name__ == "__main__":
+    main()
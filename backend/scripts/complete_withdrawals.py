@@ -0,0 +1,36 @@
+"""
+Mark withdrawals as paid out once the bank transfer has been sent.
+
+Each completion releases the held amount and removes it from the user's
+portfolio aggregate in one transaction. Pending withdrawals can be listed
+with --list.
+
+Usage (from backend/):
+    python -m scripts.complete_withdrawals --list
+    python -m scripts.complete_withdrawals <withdrawal_id> [...]
+"""
+import sys
+
+from app.index import db, DAILY_INTEREST_RATE
+from app.withdrawals import WITHDRAWAL_COLLECTION, WithdrawalStateError, complete_withdrawal
+
+
+def main():
+    args = sys.argv[1:]
+    if not args or args == ["--list"]:
+        for doc in db.collection(WITHDRAWAL_COLLECTION).where("status", "==", "pending").stream():
+            w = doc.to_dict()
+            print(f"{doc.id}  user={w.get('userId')}  amount={w.get('amount')}  requested={w.get('requestedAt')}")
+        return
+
+    for withdrawal_id in args:
+        try:
+            withdrawal = complete_withdrawal(db, withdrawal_id, DAILY_INTEREST_RATE)
+        except (LookupError, WithdrawalStateError) as e:
+            print(f"⚠️ {e}")
+            continue
+        print(f"✅ {withdrawal_id}: {withdrawal['amount']} paid out to {withdrawal['accountId']}")
+
+
+if __name__ == "__main__":
+    main()
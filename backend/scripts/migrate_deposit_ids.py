@@ -0,0 +1,61 @@
+"""
+Re-key deposits created under random UUIDs to their Stripe payment intent ID,
+so the payment webhook can find them with a single point read.
+
+Usage (from backend/):
+    python -m scripts.migrate_deposit_ids [--dry-run]
+
+Safe to re-run: deposits already keyed by their payment intent are skipped.
+"""
+import sys
+
+from app.index import db
+
+PAGE_SIZE = 500
+BATCH_DOCS = 250  # each move is a set + delete, Firestore allows 500 writes per batch
+
+
+def main():
+    dry_run = "--dry-run" in sys.argv
+    moved = skipped = conflicts = 0
+    batch, pending = db.batch(), 0
+    last = None
+
+    while True:
+        query = db.collection("deposits").order_by("__name__").limit(PAGE_SIZE)
+        if last is not None:
+            query = query.start_after(last)
+        docs = list(query.stream())
+        if not docs:
+            break
+        last = docs[-1]
+
+        for doc in docs:
+            data = doc.to_dict()
+            payment_intent_id = data.get("paymentIntentId")
+            if not payment_intent_id or doc.id == payment_intent_id:
+                skipped += 1
+                continue
+            target = db.collection("deposits").document(payment_intent_id)
+            if target.get().exists:
+                conflicts += 1
+                print(f"⚠️ {payment_intent_id} already exists, leaving {doc.id} in place")
+                continue
+            moved += 1
+            if dry_run:
+                continue
+            batch.set(target, {**data, "depositId": payment_intent_id, "legacyDepositId": doc.id})
+            batch.delete(doc.reference)
+            pending += 1
+            if pending >= BATCH_DOCS:
+                batch.commit()
+                batch, pending = db.batch(), 0
+
+    if pending and not dry_run:
+        batch.commit()
+    print(f"✅ {'Would move' if dry_run else 'Moved'} {moved} deposits, "
+          f"{skipped} already keyed or without payment intent, {conflicts} conflicts")
+
+
+if __name__ == "__main__":
+    main()
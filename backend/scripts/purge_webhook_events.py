@@ -0,0 +1,57 @@
+"""
+Delete expired webhookEvents / webhookErrors docs and old finished rows of the
+local webhook queue.
+
+Usage (from backend/):
+    python -m scripts.purge_webhook_events [--legacy-days N]
+
+Docs written before compact storage have no expiresAt; --legacy-days also
+deletes those whose processedAt/timestamp is older than N days.
+A Firestore TTL policy on `expiresAt` can replace the first step entirely.
+"""
+import argparse
+import os
+from datetime import datetime, timedelta
+
+from app.index import db
+from app.webhook_queue import WEBHOOK_QUEUE_PATH, WebhookQueue
+from app.webhook_storage import PURGE_BATCH_SIZE, WEBHOOK_EVENT_RETENTION_DAYS, purge_expired
+
+LEGACY_TIME_FIELDS = {"webhookEvents": "processedAt", "webhookErrors": "timestamp"}
+
+
+def purge_legacy(collection: str, field: str, days: int) -> int:
+    """Batch-delete pre-TTL docs by their ISO timestamp field"""
+    cutoff = (datetime.now() - timedelta(days=days)).isoformat()
+    deleted = 0
+    while True:
+        docs = list(db.collection(collection).where(field, "<", cutoff).limit(PURGE_BATCH_SIZE).stream())
+        docs = [doc for doc in docs if "expiresAt" not in (doc.to_dict() or {})]
+        if not docs:
+            return deleted
+        batch = db.batch()
+        for doc in docs:
+            batch.delete(doc.reference)
+        batch.commit()
+        deleted += len(docs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--legacy-days", type=int, help="Also delete pre-TTL docs older than this many days")
+    args = parser.parse_args()
+
+    for collection, field in LEGACY_TIME_FIELDS.items():
+        deleted = purge_expired(db, collection)
+        print(f"🗑️ {collection}: deleted {deleted} expired docs")
+        if args.legacy_days:
+            deleted = purge_legacy(collection, field, args.legacy_days)
+            print(f"🗑️ {collection}: deleted {deleted} legacy docs")
+
+    if os.path.exists(WEBHOOK_QUEUE_PATH):
+        deleted = WebhookQueue().purge_done(WEBHOOK_EVENT_RETENTION_DAYS * 86400)
+        print(f"🗑️ webhook queue: deleted {deleted} finished events")
+
+
+if __name__ == "__main__":
+    main()
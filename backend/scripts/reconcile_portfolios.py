@@ -0,0 +1,26 @@
+"""
+Rebuild every user's portfolio aggregate from the raw `investments` collection.
+
+Usage (from backend/):
+    python -m scripts.reconcile_portfolios [user_id ...]
+"""
+import sys
+
+from app.index import db, DAILY_INTEREST_RATE
+from app.portfolio_aggregate import rebuild_aggregate, reconcile_all
+
+
+def main():
+    user_ids = sys.argv[1:]
+    if user_ids:
+        for user_id in user_ids:
+            aggregate = rebuild_aggregate(db, user_id, DAILY_INTEREST_RATE)
+            print(f"✅ {user_id}: totalInvested={aggregate['totalInvested']:.2f} positions={aggregate['positions']}")
+        return
+
+    result = reconcile_all(db, DAILY_INTEREST_RATE)
+    print(f"✅ Reconciled {result['users']} users, {result['drifted']} had drifted")
+
+
+if __name__ == "__main__":
+    main()
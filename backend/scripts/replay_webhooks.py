@@ -0,0 +1,41 @@
+"""
+Inspect and replay events in the local webhook queue (WEBHOOK_MODE=queue).
+
+Usage (from backend/):
+    python -m scripts.replay_webhooks --list
+    python -m scripts.replay_webhooks --all-failed
+    python -m scripts.replay_webhooks evt_123 evt_456
+
+Replayed events are requeued with a fresh attempt budget; the running API's
+worker pool picks them up within a second.
+"""
+import argparse
+from datetime import datetime
+
+from app.webhook_queue import WebhookQueue
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("event_ids", nargs="*", help="Event IDs to replay")
+    parser.add_argument("--list", action="store_true", help="List failed events")
+    parser.add_argument("--all-failed", action="store_true", help="Replay every failed event")
+    args = parser.parse_args()
+
+    queue = WebhookQueue()
+    if args.list:
+        for event_id, event_type, attempts, error, received_at in queue.failed(limit=1000):
+            print(f"{event_id}  {event_type}  attempts={attempts}  "
+                  f"received={datetime.fromtimestamp(received_at).isoformat()}  error={error}")
+        print(f"depth={queue.depth()} lag={queue.lag()}s")
+        return
+
+    if args.event_ids or args.all_failed:
+        count = queue.replay(args.event_ids or None)
+        print(f"🔄 Requeued {count} events")
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
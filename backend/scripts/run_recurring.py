@@ -0,0 +1,24 @@
+"""
+Execute every recurring investment whose nextRecurringDate has passed.
+
+Meant to run from cron. An interrupted run resumes from its checkpoint
+(RECURRING_CHECKPOINT_PATH) unless --fresh is given.
+
+Usage (from backend/):
+    python -m scripts.run_recurring [--fresh]
+"""
+import sys
+
+from app.index import db
+from app.recurring import RecurringScheduler
+
+
+def main():
+    scheduler = RecurringScheduler(db)
+    result = scheduler.run(resume="--fresh" not in sys.argv[1:])
+    print(f"✅ Executed {result['executed']} recurring investments over {result['pages']} pages "
+          f"in {result['seconds']}s (due before {result['cutoff']})")
+
+
+if __name__ == "__main__":
+    main()
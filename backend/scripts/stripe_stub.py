@@ -0,0 +1,81 @@
+"""
+Minimal local stand-in for the Stripe API, for offline load tests.
+
+Usage (from backend/):
+    STRIPE_STUB_LATENCY_MS=80 python -m scripts.stripe_stub --port 12111
+    STRIPE_API_BASE=http://127.0.0.1:12111 STRIPE_API_KEY=sk_test_stub uvicorn app.index:app
+
+Implements POST /v1/payment_intents and GET /v1/payment_intents/{id} and
+/v1/customers/{id}, echoing back form-encoded params (including nested
+metadata[...] keys) the way Stripe does.
+"""
+import argparse
+import asyncio
+import os
+import time
+import uuid
+from urllib.parse import parse_qsl
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+LATENCY_SECONDS = float(os.getenv("STRIPE_STUB_LATENCY_MS", "0")) / 1000
+
+app = FastAPI(title="Stripe stub")
+PAYMENT_INTENTS = {}
+
+
+def parse_form(body: bytes) -> dict:
+    """Decode Stripe's form encoding, e.g. metadata[userId]=u1 -> {"metadata": {"userId": "u1"}}"""
+    params = {}
+    for key, value in parse_qsl(body.decode("utf-8"), keep_blank_values=True):
+        parts = key.replace("]", "").split("[")
+        target = params
+        for part in parts[:-1]:
+            target = target.setdefault(part, {})
+        target[parts[-1]] = value
+    return params
+
+
+@app.post("/v1/payment_intents")
+async def create_payment_intent(request: Request):
+    await asyncio.sleep(LATENCY_SECONDS)
+    params = parse_form(await request.body())
+    intent_id = f"pi_stub_{uuid.uuid4().hex[:24]}"
+    intent = {
+        "id": intent_id,
+        "object": "payment_intent",
+        "amount": int(params.get("amount", 0)),
+        "currency": params.get("currency", "usd"),
+        "description": params.get("description"),
+        "metadata": params.get("metadata", {}),
+        "client_secret": f"{intent_id}_secret_{uuid.uuid4().hex[:16]}",
+        "status": "requires_payment_method",
+        "created": int(time.time()),
+        "livemode": False,
+    }
+    PAYMENT_INTENTS[intent_id] = intent
+    return intent
+
+
+@app.get("/v1/payment_intents/{intent_id}")
+async def retrieve_payment_intent(intent_id: str):
+    await asyncio.sleep(LATENCY_SECONDS)
+    if intent_id not in PAYMENT_INTENTS:
+        return JSONResponse(status_code=404, content={"error": {
+            "type": "invalid_request_error", "message": f"No such payment_intent: '{intent_id}'"}})
+    return PAYMENT_INTENTS[intent_id]
+
+
+@app.get("/v1/customers/{customer_id}")
+async def retrieve_customer(customer_id: str):
+    await asyncio.sleep(LATENCY_SECONDS)
+    return {"id": customer_id, "object": "customer", "metadata": {"userId": f"user_{customer_id}"}}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=12111)
+    args = parser.parse_args()
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
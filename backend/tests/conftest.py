@@ -0,0 +1,26 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# app.index opens its journals and queues at import time; keep them out of the tree
+_workdir = tempfile.mkdtemp(prefix="backend_tests_")
+os.environ.setdefault("WEBHOOK_QUEUE_PATH", os.path.join(_workdir, "webhook_queue.db"))
+os.environ.setdefault("WEBHOOK_ARCHIVE_DIR", os.path.join(_workdir, "webhook_archive"))
+os.environ.setdefault("DEPOSIT_JOURNAL_PATH", os.path.join(_workdir, "deposit_journal.db"))
+os.environ.setdefault("RECURRING_CHECKPOINT_PATH", os.path.join(_workdir, "recurring_checkpoint.json"))
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def api():
+    """app.index wired to a fresh in-memory Firestore"""
+    from app import index
+    from app import portfolio_aggregate
+    from app.fake_firestore import FakeFirestore
+
+    index.db = FakeFirestore()
+    portfolio_aggregate._bootstrapped.clear()
+    return index
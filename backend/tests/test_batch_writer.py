@@ -0,0 +1,24 @@
+import asyncio
+
+from app.batch_writer import BatchWriter, WriteJournal
+from app.fake_firestore import FakeFirestore
+
+
+def test_replayed_create_only_writes_keep_existing_documents(tmp_path):
+    db = FakeFirestore()
+    journal = WriteJournal(str(tmp_path / "journal.db"))
+    # Acknowledged by a previous process but never committed; the webhook completed one of them since
+    for intent_id in ("pi_done", "pi_new"):
+        journal.append(f"deposits/{intent_id}", {"depositId": intent_id, "amount": 250.0, "status": "pending"})
+    db.seed("deposits", "pi_done", {"depositId": "pi_done", "amount": 250.0, "status": "completed"})
+
+    async def replay():
+        writer = BatchWriter(lambda: db, "test_deposit_writes", journal=journal, create_only=True)
+        writer.start()
+        await writer.stop()
+
+    asyncio.run(replay())
+
+    assert db.document("deposits/pi_done").get().to_dict()["status"] == "completed"
+    assert db.document("deposits/pi_new").get().to_dict()["status"] == "pending"
+    assert len(journal) == 0
@@ -0,0 +1,69 @@
+import asyncio
+
+from fastapi import BackgroundTasks
+
+
+def seed_user(db, invested: float = 0.0):
+    db.seed("users", "user", {"uid": "user", "financialInfo": {"totalInvested": invested, "portfolioValue": invested}})
+
+
+def deliver(api, event_id: str, event_type: str, obj: dict):
+    event = {"id": event_id, "type": event_type, "data": {"object": obj}}
+    return asyncio.run(api.process_stripe_event(event, BackgroundTasks()))
+
+
+def intent_succeeded(intent_id: str, cents: int) -> dict:
+    return {
+        "id": intent_id, "object": "payment_intent", "amount": cents, "currency": "inr",
+        "payment_method": "pm_card_visa", "description": "Account deposit",
+        "metadata": {"userId": "user", "purpose": "account_deposit"},
+    }
+
+
+def charge_succeeded(charge_id: str, intent_id: str, cents: int) -> dict:
+    # Charges carry their payment intent's metadata
+    return {
+        "id": charge_id, "object": "charge", "payment_intent": intent_id, "amount": cents, "currency": "inr",
+        "payment_method": "pm_card_visa", "metadata": {"userId": "user", "purpose": "account_deposit"},
+    }
+
+
+def test_payment_for_missing_deposit_record_is_still_credited(api):
+    db = api.db
+    seed_user(db, 10.0)
+
+    deliver(api, "evt_lost_deposit", "payment_intent.succeeded", intent_succeeded("pi_lost", 25000))
+
+    info = db.document("users/user").get().to_dict()["financialInfo"]
+    assert info["totalInvested"] == 260.0
+    assert info["portfolioValue"] == 260.0
+    deposit = db.document("deposits/pi_lost").get().to_dict()
+    assert deposit["status"] == "completed"
+    assert deposit["userId"] == "user" and deposit["amount"] == 250.0 and deposit["paymentIntentId"] == "pi_lost"
+
+
+def test_intent_and_charge_events_credit_a_deposit_once(api):
+    db = api.db
+    seed_user(db)
+    db.seed("deposits", "pi_1", {"depositId": "pi_1", "userId": "user", "amount": 250.0,
+                                 "status": "pending", "paymentIntentId": "pi_1"})
+
+    deliver(api, "evt_intent", "payment_intent.succeeded", intent_succeeded("pi_1", 25000))
+    deliver(api, "evt_charge", "charge.succeeded", charge_succeeded("ch_1", "pi_1", 25000))
+
+    assert db.document("users/user").get().to_dict()["financialInfo"]["totalInvested"] == 250.0
+    assert db.document("deposits/pi_1").get().to_dict()["status"] == "completed"
+    assert not db.document("deposits/ch_1").get().exists
+
+
+def test_charge_for_missing_deposit_is_left_to_its_intent_event(api):
+    db = api.db
+    seed_user(db)
+
+    deliver(api, "evt_charge_first", "charge.succeeded", charge_succeeded("ch_2", "pi_2", 25000))
+    assert db.count("deposits") == 0
+    assert db.document("users/user").get().to_dict()["financialInfo"]["totalInvested"] == 0.0
+
+    deliver(api, "evt_intent_later", "payment_intent.succeeded", intent_succeeded("pi_2", 25000))
+    assert db.document("users/user").get().to_dict()["financialInfo"]["totalInvested"] == 250.0
+    assert db.document("deposits/pi_2").get().to_dict()["status"] == "completed"
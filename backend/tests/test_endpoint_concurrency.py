@@ -0,0 +1,39 @@
+import asyncio
+import time
+
+import httpx
+
+from app.portfolio_aggregate import AGGREGATE_COLLECTION
+
+FIRESTORE_LATENCY = 0.02
+REQUESTS = 64
+
+
+async def throughput(api, in_flight: int) -> float:
+    """Completed /api/portfolio requests per second with `in_flight` requests outstanding"""
+    semaphore = asyncio.Semaphore(in_flight)
+    transport = httpx.ASGITransport(app=api.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        async def one():
+            async with semaphore:
+                response = await client.get("/api/portfolio")
+                assert response.status_code == 200
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(REQUESTS)))
+        return REQUESTS / (time.perf_counter() - start)
+
+
+def test_throughput_scales_with_in_flight_requests(api):
+    # Every Firestore round trip sleeps, so a blocked event loop would serialize requests
+    api.db.latency = FIRESTORE_LATENCY
+    api.db.seed(AGGREGATE_COLLECTION, "user", {"userId": "user", "totalInvested": 100.0, "discountedSum": 100.0})
+    api.app.dependency_overrides[api.get_current_user] = lambda: {"uid": "user"}
+    try:
+        serial = asyncio.run(throughput(api, 1))
+        concurrent = asyncio.run(throughput(api, 16))
+    finally:
+        api.app.dependency_overrides.clear()
+
+    assert serial < 1 / FIRESTORE_LATENCY
+    assert concurrent > 4 * serial
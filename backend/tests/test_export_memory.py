@@ -0,0 +1,54 @@
+import asyncio
+import tracemalloc
+
+import pytest
+
+from app.exports import EXPORT_PAGE_SIZE, TRANSACTION_COLUMNS, export_rows, make_encoder
+
+
+def synthetic_pages(total: int):
+    """Page source producing `total` transaction rows on demand, like firestore_pages"""
+    async def source(cursor):
+        start = int(cursor or 0)
+        end = min(total, start + EXPORT_PAGE_SIZE)
+        rows = [{
+            "transactionId": f"txn_{i:08d}",
+            "userId": "user",
+            "type": "deposit",
+            "amount": 100.0 + i % 97,
+            "status": "completed",
+            "timestamp": f"2024-01-01T00:00:{i % 60:02d}",
+            "metadata": {"paymentIntentId": f"pi_{i:08d}", "description": "Account deposit"},
+        } for i in range(start, end)]
+        return rows, (str(end) if end < total else None)
+    return source
+
+
+def export_peak(fmt: str, total: int):
+    """(lines written, peak traced bytes) for streaming `total` rows and discarding each chunk"""
+    async def consume():
+        lines = 0
+        async for chunk in export_rows(synthetic_pages(total), make_encoder(fmt, TRANSACTION_COLUMNS)):
+            lines += chunk.count("\n")
+        return lines
+
+    tracemalloc.start()
+    try:
+        lines = asyncio.run(consume())
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return lines, peak
+
+
+@pytest.mark.parametrize("fmt", ["ndjson", "csv"])
+def test_export_memory_stays_flat(fmt):
+    header = 1 if fmt == "csv" else 0
+    small_lines, small_peak = export_peak(fmt, 1_000)
+    lines, peak = export_peak(fmt, 100_000)
+
+    assert small_lines == 1_000 + header
+    assert lines == 100_000 + header
+    # A hundred times the rows must not mean more memory: only one page is ever held
+    assert peak < 2 * small_peak
+    assert peak < 8 * 1024 * 1024
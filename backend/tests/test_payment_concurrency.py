@@ -0,0 +1,62 @@
+import asyncio
+import time
+import uuid
+
+from fastapi import BackgroundTasks
+
+from app.portfolio_aggregate import AGGREGATE_COLLECTION
+
+USER_ID = "concurrent_user"
+PAYMENTS = 1000
+
+
+def succeeded_event(intent_id: str, cents: int, metadata: dict) -> dict:
+    return {
+        "id": f"evt_{uuid.uuid4().hex[:24]}",
+        "type": "payment_intent.succeeded",
+        "data": {"object": {
+            "id": intent_id, "object": "payment_intent", "amount": cents, "currency": "inr",
+            "payment_method": "pm_card_visa", "metadata": {"userId": USER_ID, **metadata},
+        }},
+    }
+
+
+def seed_payments(db) -> list:
+    """Half deposits, half payments for pending investments; amounts 1..PAYMENTS"""
+    now = time.strftime("%Y-%m-%dT%H:%M:%S")
+    db.seed("users", USER_ID, {"uid": USER_ID, "financialInfo": {"totalInvested": 0, "portfolioValue": 0}})
+    events = []
+    for i in range(PAYMENTS):
+        amount = float(i + 1)
+        intent_id = f"pi_{i}"
+        if i % 2:
+            db.seed("deposits", intent_id, {"depositId": intent_id, "userId": USER_ID, "amount": amount,
+                                            "status": "pending", "paymentIntentId": intent_id, "createdAt": now})
+            events.append(succeeded_event(intent_id, int(amount * 100), {"purpose": "account_deposit"}))
+        else:
+            investment_id = f"inv_{i}"
+            db.seed("investments", investment_id, {"investmentId": investment_id, "userId": USER_ID,
+                                                   "amount": amount, "status": "pending", "timestamp": now})
+            events.append(succeeded_event(intent_id, int(amount * 100), {"investmentId": investment_id}))
+    return events
+
+
+def test_concurrent_successful_payments_keep_totals(api):
+    db = api.db
+    events = seed_payments(db)
+
+    async def deliver_all():
+        return await asyncio.gather(*(api.process_stripe_event(e, BackgroundTasks()) for e in events))
+
+    results = asyncio.run(deliver_all())
+
+    assert all(r["status"] == "success" for r in results)
+    expected = PAYMENTS * (PAYMENTS + 1) / 2
+    info = db.document(f"users/{USER_ID}").get().to_dict()["financialInfo"]
+    assert info["totalInvested"] == expected
+    assert info["portfolioValue"] == expected
+    assert all(d.get("status") == "completed" for d in db.collection("deposits").stream())
+    assert all(d.get("status") == "active" for d in db.collection("investments").stream())
+    # Investments were seeded without an aggregate; its bootstrap must count each of them once
+    aggregate = db.document(f"{AGGREGATE_COLLECTION}/{USER_ID}").get().to_dict()
+    assert aggregate["totalInvested"] == sum(float(i + 1) for i in range(0, PAYMENTS, 2))
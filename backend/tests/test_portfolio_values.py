@@ -0,0 +1,30 @@
+from datetime import datetime, timedelta
+
+from app.portfolio_aggregate import read_portfolio
+
+
+def seed_investment(db, investment_id: str, user_id: str, amount: float, days_ago: int, **fields):
+    db.seed("investments", investment_id, {
+        "investmentId": investment_id, "userId": user_id, "amount": amount, "status": "active",
+        "timestamp": (datetime.now() - timedelta(days=days_ago)).isoformat(), **fields,
+    })
+
+
+def test_bulk_values_match_the_per_user_aggregate(api):
+    db = api.db
+    seed_investment(db, "a1", "alice", 1000.0, 400)
+    seed_investment(db, "a2", "alice", 500.0, 30, status="refunded", refundAmount=200.0)
+    seed_investment(db, "a3", "alice", 300.0, 10, status="failed")
+    seed_investment(db, "b1", "bob", 250.0, 90)
+    db.seed("withdrawals", "w1", {"userId": "bob", "amount": 100.0, "status": "completed",
+                                  "completedAt": (datetime.now() - timedelta(days=5)).isoformat()})
+    db.seed("withdrawals", "w2", {"userId": "bob", "amount": 50.0, "status": "pending"})
+
+    bulk = api.get_portfolio_values(["alice", "bob", "carol"])
+
+    for user_id in ("alice", "bob", "carol"):
+        single = read_portfolio(db, user_id, api.DAILY_INTEREST_RATE, api.ANNUAL_INTEREST_RATE)
+        assert bulk[user_id] == single
+    assert bulk["alice"]["total_invested"] == 1300.0
+    assert bulk["bob"]["total_invested"] == 150.0
+    assert bulk["carol"]["total_invested"] == 0.0
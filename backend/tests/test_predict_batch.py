@@ -0,0 +1,28 @@
+import asyncio
+
+import httpx
+
+from app.inference import WITHDRAWAL_FEATURES
+
+
+def test_bad_rows_get_per_row_errors(api):
+    valid = {name: 1.0 for name in WITHDRAWAL_FEATURES}
+    rows = [valid, 5, "row", None, {}, {**valid, WITHDRAWAL_FEATURES[0]: "lots"}, valid]
+
+    async def post():
+        transport = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post("/api/predict/withdrawal/batch", json=rows)
+
+    response = asyncio.run(post())
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["scored"] == 2 and body["failed"] == 5
+    results = body["results"]
+    assert [r["index"] for r in results] == list(range(len(rows)))
+    assert results[0]["can_withdraw"] in (0, 1) and results[6]["can_withdraw"] in (0, 1)
+    for i in (1, 2, 3):
+        assert results[i]["error"] == "Row must be an object of features"
+    assert results[4]["error"].startswith("Missing feature")
+    assert results[5]["error"] == "Features must be numeric"
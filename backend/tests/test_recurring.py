@@ -0,0 +1,57 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from fastapi import BackgroundTasks
+
+from app.portfolio_aggregate import compute_aggregate, read_portfolio
+from app.recurring import Checkpoint, RecurringScheduler
+
+USER_ID = "recurring_user"
+
+
+def seed_parent(db, investment_id: str, status: str, amount: float, due: str):
+    db.seed("investments", investment_id, {
+        "investmentId": investment_id, "userId": USER_ID, "amount": amount, "status": status,
+        "timestamp": "2024-06-01T00:00:00", "recurring": True, "frequency": "monthly",
+        "nextRecurringDate": due,
+    })
+
+
+def test_only_active_parents_spawn_children_that_count_once_paid(api, tmp_path):
+    db = api.db
+    due = (datetime.now() - timedelta(days=1)).isoformat()
+    db.seed("users", USER_ID, {"uid": USER_ID, "financialInfo": {"totalInvested": 0}})
+    seed_parent(db, "active", "active", 50.0, due)
+    seed_parent(db, "unpaid", "pending", 20.0, due)
+    seed_parent(db, "failed", "failed", 30.0, due)
+
+    result = RecurringScheduler(db, checkpoint=Checkpoint(str(tmp_path / "checkpoint.json"))).run()
+
+    assert result["executed"] == 1
+    children = [d.to_dict() for d in db.collection("investments").where("parentInvestmentId", "==", "active").stream()]
+    assert len(children) == 1
+    child = children[0]
+    assert child["status"] == "pending" and child["inAggregate"] is False
+    assert not list(db.collection("investments").where("parentInvestmentId", "==", "unpaid").stream())
+    unpaid = db.document("investments/unpaid").get().to_dict()
+    assert unpaid["nextRecurringDate"] > datetime.now().isoformat()
+    assert db.document("investments/failed").get().to_dict()["nextRecurringDate"] is None
+
+    # The unpaid child's principal isn't invested yet
+    rate = api.DAILY_INTEREST_RATE
+    assert read_portfolio(db, USER_ID, rate, api.ANNUAL_INTEREST_RATE)["total_invested"] == 70.0
+
+    event = {
+        "id": "evt_child_paid",
+        "type": "payment_intent.succeeded",
+        "data": {"object": {
+            "id": "pi_child", "object": "payment_intent", "amount": 5000, "currency": "inr",
+            "payment_method": "pm_card_visa",
+            "metadata": {"userId": USER_ID, "investmentId": child["investmentId"]},
+        }},
+    }
+    asyncio.run(api.process_stripe_event(event, BackgroundTasks()))
+
+    assert read_portfolio(db, USER_ID, rate, api.ANNUAL_INTEREST_RATE)["total_invested"] == 120.0
+    assert compute_aggregate(db, USER_ID, rate)["totalInvested"] == 120.0
+    assert db.document(f"investments/{child['investmentId']}").get().to_dict()["inAggregate"] is True
@@ -0,0 +1,63 @@
+import asyncio
+import time
+
+import pytest
+
+from app.fake_stripe import FakeStripeClient
+from app.stripe_lookup import StripeLookup
+
+
+@pytest.fixture
+def client():
+    client = FakeStripeClient()
+    client.add_payment_intent("pi_1", {"userId": "user", "investmentId": "inv_1"})
+    client.add_customer("cus_1", {"userId": "user"})
+    return client
+
+
+def test_repeated_lookups_are_served_from_cache(client):
+    lookup = StripeLookup(client)
+
+    async def twice():
+        return [await lookup.customer_metadata("cus_1") for _ in range(2)]
+
+    first, second = asyncio.run(twice())
+
+    assert first == second == {"userId": "user"}
+    assert type(first) is dict
+    assert client.calls["customer"] == 1
+
+
+def test_cached_metadata_expires_after_ttl(client):
+    lookup = StripeLookup(client, ttl=0.05)
+
+    async def across_expiry():
+        await lookup.payment_intent_metadata("pi_1")
+        time.sleep(0.1)
+        return await lookup.payment_intent_metadata("pi_1")
+
+    assert asyncio.run(across_expiry()) == {"userId": "user", "investmentId": "inv_1"}
+    assert client.calls["payment_intent"] == 2
+
+
+def test_concurrent_identical_lookups_share_one_call(client):
+    client.latency = 0.05
+    lookup = StripeLookup(client)
+
+    async def together():
+        return await asyncio.gather(*(lookup.payment_intent_metadata("pi_1") for _ in range(20)))
+
+    results = asyncio.run(together())
+
+    assert all(r == {"userId": "user", "investmentId": "inv_1"} for r in results)
+    assert client.calls["payment_intent"] == 1
+
+
+def test_failed_lookup_is_not_cached(client):
+    lookup = StripeLookup(client)
+
+    with pytest.raises(LookupError):
+        asyncio.run(lookup.customer_metadata("cus_missing"))
+    client.add_customer("cus_missing", {"userId": "late"})
+
+    assert asyncio.run(lookup.customer_metadata("cus_missing")) == {"userId": "late"}
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from app.inference import load_model
+from app.tree_ensemble import CompiledEnsemble, parity_rows
+
+ROWS = 2000
+
+
+def small_forest(n_features: int = 6, seed: int = 0):
+    from sklearn.ensemble import RandomForestClassifier
+
+    rng = np.random.default_rng(seed)
+    X = rng.random((2000, n_features)) * 10.0 ** rng.integers(0, 4, size=(2000, n_features))
+    y = (X[:, 0] > X[:, 3]).astype(int) + (X[:, 1] > X[:, 2])
+    # Missing values in training give the trees learned missing-value directions
+    X[rng.random(X.shape) < 0.05] = np.nan
+    return RandomForestClassifier(n_estimators=20, max_depth=8, random_state=seed).fit(X, y)
+
+
+@pytest.fixture(scope="module", params=["xgboost", "forest"])
+def model(request):
+    if request.param == "xgboost":
+        return load_model("withdrawal", compiled=False)
+    return small_forest()
+
+
+def test_compiled_predict_matches_model_predict(model):
+    compiled = CompiledEnsemble.from_model(model)
+    X = parity_rows(compiled.n_features, ROWS, seed=1)
+    # Rows missing every feature, and one missing all but the first
+    X[:3] = np.nan
+    X[3, 1:] = np.nan
+    assert np.isnan(X).any(axis=1).sum() > 3
+
+    np.testing.assert_array_equal(compiled.predict(X), model.predict(X))
+    np.testing.assert_allclose(compiled.predict_proba(X), model.predict_proba(X), rtol=1e-5, atol=1e-6)
+
+
+def test_compiled_rejects_wrong_feature_count(model):
+    compiled = CompiledEnsemble.from_model(model)
+    with pytest.raises(ValueError):
+        compiled.predict(np.zeros((1, compiled.n_features + 1)))